@@ -0,0 +1,296 @@
+"""This module keeps the output of the locale builds in a cache shared by the runs, keyed by
+their inputs, so that a locale whose inputs were already built somewhere is restored instead of
+built"""
+
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from importlib import metadata
+
+from .constants import CACHE_DIR, VERSION
+from .util import color_join, info, mag, Step
+
+
+DEFAULT_DIR = os.path.join(CACHE_DIR, 'artifacts')
+
+# The maximum size of the cache by default, in MB
+DEFAULT_SIZE = 2048
+
+# The metadata files of the entries, named after their keys
+METADATA = re.compile(r'[0-9a-f]{64}\.json')
+
+# The outcomes of the cache lookups of this run
+STATS = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0, 'restored_bytes': 0}
+_LOCK = threading.Lock()
+
+
+def count(**increments):
+    """
+    Update the statistics of the run
+    :param increments: The increments, by statistic
+    """
+    with _LOCK:
+        for name, increment in increments.items():
+            STATS[name] += increment
+
+
+def reset():
+    """Forget the statistics, in a newly started worker process"""
+    for name in STATS:
+        STATS[name] = 0
+
+
+def merge(stats):
+    """
+    Add the statistics of a worker process to the ones of the run
+    :param stats: The statistics of the worker
+    """
+    count(**stats)
+
+
+@lru_cache(maxsize=None)
+def tool_versions():
+    """
+    Get the versions of Python, Vizir and every installed distribution, since the output depends
+    on Sphinx, its extensions and the themes
+    """
+    distributions = sorted(f'{dist.metadata["Name"]}=={dist.version}'
+                           for dist in metadata.distributions())
+    return [sys.version, VERSION] + distributions
+
+
+def artifact_key(hashes, locale, main=False, options=None):
+    """
+    Compute the key of the output of a locale
+    :param hashes: The hashes of the staged files of the project, by path relative to the project
+                   directory, which include the rendered conf.py
+    :param locale: The locale
+    :param main: Whether the locale is the main one
+    :param options: The processing options changing the output, by name
+    """
+    sha256 = hashlib.sha256(json.dumps([locale, main, tool_versions(), options or {}],
+                                       sort_keys=True).encode('utf8'))
+    for name in sorted(hashes):
+        sha256.update(f'{name}\0{hashes[name]}\n'.encode('utf8'))
+    return sha256.hexdigest()
+
+
+def tree_size(path):
+    """
+    Compute the size of the files of a directory
+    :param path: The directory
+    """
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(path) for name in files)
+
+
+class Backend(ABC):
+    """The storage of an artifact cache"""
+
+    @abstractmethod
+    def restore(self, key, destination):
+        """
+        Copy an entry to a directory, if it exists
+        :param key: The entry key
+        :param destination: The directory, which must not exist
+        :return: The number of bytes restored, or None on a miss
+        """
+
+    @abstractmethod
+    def store(self, key, source):
+        """
+        Add a directory to the cache
+        :param key: The entry key
+        :param source: The directory
+        :return: The number of entries evicted to make room for it, or None if the entry was
+                 already stored
+        """
+
+
+class LocalBackend(Backend):
+    """
+    An artifact cache in a local directory, which may be shared by several runners. Each entry is
+    a directory next to a metadata file holding its size, whose modification time is its last use
+    and determines which entries are evicted first when the cache outgrows its maximum size.
+    """
+
+    def __init__(self, root=DEFAULT_DIR, max_size=DEFAULT_SIZE):
+        """
+        :param root: The cache directory
+        :param max_size: The maximum size of the entries, in MB (0 for no limit)
+        """
+        self.root = root
+        self.max_size = max_size * 1024 * 1024
+
+    def _entry(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def restore(self, key, destination):
+        entry = self._entry(key)
+        try:
+            with open(f'{entry}.json', 'r', encoding='utf8') as file:
+                size = json.load(file)['size']
+            shutil.copytree(entry, destination, symlinks=True)
+            os.utime(f'{entry}.json')
+        except (OSError, ValueError, KeyError):
+            # The entry does not exist, or it was evicted while being copied
+            shutil.rmtree(destination, ignore_errors=True)
+            return None
+        return size
+
+    def store(self, key, source):
+        entry = self._entry(key)
+        if os.path.exists(f'{entry}.json'):
+            return None
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        temp = f'{entry}.{os.getpid()}.{threading.get_ident()}.tmp'
+        shutil.copytree(source, temp, symlinks=True)
+        if os.path.isdir(entry) and not os.path.exists(f'{entry}.json'):
+            # A runner stopped before writing the metadata of the entry, or an eviction stopped
+            # before removing it
+            shutil.rmtree(entry, ignore_errors=True)
+        try:
+            os.rename(temp, entry)
+        except OSError:
+            # Another runner stored the same entry in the meantime
+            shutil.rmtree(temp)
+            return None
+        with open(f'{entry}.json.tmp{os.getpid()}', 'w', encoding='utf8') as file:
+            json.dump({'size': tree_size(entry), 'time': time.time()}, file)
+        os.replace(f'{entry}.json.tmp{os.getpid()}', f'{entry}.json')
+        return self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache fits in its maximum size
+        :return: The number of entries removed
+        """
+        if not self.max_size:
+            return 0
+        entries = []
+        for root, _, files in os.walk(self.root):
+            for name in files:
+                if METADATA.fullmatch(name):
+                    path = os.path.join(root, name)
+                    try:
+                        with open(path, 'r', encoding='utf8') as file:
+                            entries.append((os.path.getmtime(path), json.load(file)['size'],
+                                            path[:-len('.json')]))
+                    except (OSError, ValueError, KeyError):
+                        continue
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, entry in sorted(entries):
+            if total <= self.max_size:
+                break
+            # The metadata goes first so that the entry is not restored while being removed
+            try:
+                os.remove(f'{entry}.json')
+            except FileNotFoundError:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
+
+
+# The backends, by scheme
+BACKENDS = {'local': LocalBackend}
+
+
+def open_cache(location, max_size=DEFAULT_SIZE):
+    """
+    Open an artifact cache
+    :param location: The cache location, as <scheme>:<location> or a local directory
+    :param max_size: The maximum size of the cache, in MB (0 for no limit)
+    :return: The backend
+    """
+    scheme, _, path = location.partition(':')
+    if scheme not in BACKENDS or not path:
+        scheme, path = 'local', location
+    return BACKENDS[scheme](path, max_size)
+
+
+def restore(cache, key, destination):
+    """
+    Restore the output of a locale from the cache, keeping the statistics of the run
+    :param cache: The cache backend
+    :param key: The key of the output
+    :param destination: The output directory of the locale
+    :return: Whether the output was restored
+    """
+    shutil.rmtree(destination, ignore_errors=True)
+    size = cache.restore(key, destination)
+    if size is None:
+        count(misses=1)
+        return False
+    count(hits=1, restored_bytes=size)
+    return True
+
+
+def store(cache, key, source):
+    """
+    Store the output of a locale in the cache, keeping the statistics of the run
+    :param cache: The cache backend
+    :param key: The key of the output
+    :param source: The output directory of the locale
+    """
+    evicted = cache.store(key, source)
+    if evicted is not None:
+        count(stored=1, evicted=evicted)
+
+
+def restore_locales(cache, keys, build_dir, checkpoint, shared=False):
+    # pylint: disable=R0913
+    """
+    Restore the output of the locales which are not built yet from the cache
+    :param cache: The cache backend
+    :param keys: The keys of the output of the locales, the first one being the main one
+    :param build_dir: The output directory
+    :param checkpoint: The checkpoint of the project
+    :param shared: Whether the locales are built in a shared Sphinx process, in which case they
+                   are only restored if they are all cached
+    :return: The locales to build
+    """
+    locales = list(keys)
+    stages = {'locales': locales} if shared else {f'locale {locale}': [locale]
+                                                  for locale in locales}
+    missing = []
+    restored = 0
+    with Step('Looking up the artifact cache'):
+        for name, stage_locales in stages.items():
+            if checkpoint.complete(name):
+                continue
+            if all(restore(cache, keys[locale], os.path.join(build_dir, locale))
+                   for locale in stage_locales):
+                checkpoint.record(name, [os.path.join(build_dir, locale)
+                                         for locale in stage_locales], ['target', 'config'])
+                restored += len(stage_locales)
+            else:
+                missing += stage_locales
+    if restored:
+        info(f'{mag(str(restored))} of {mag(str(len(locales)))} locales restored from the '
+             f'artifact cache')
+    return missing
+
+
+def store_locales(cache, keys, build_dir, locales):
+    """
+    Store the output of the built locales in the cache
+    :param cache: The cache backend
+    :param keys: The keys of the output of the locales
+    :param build_dir: The output directory
+    :param locales: The built locales
+    """
+    with Step(f'Storing the {color_join(", ", locales, mag)} '
+              f'{"locale" if len(locales) == 1 else "locales"} in the artifact cache'):
+        for locale in locales:
+            store(cache, keys[locale], os.path.join(build_dir, locale))
@@ -0,0 +1,115 @@
+"""This module runs the Sphinx builds in subprocesses, with a memory limit and a timeout"""
+
+
+import os
+import sys
+import time
+import signal
+import threading
+import subprocess
+
+from .incremental import doctrees_dir
+from .tracing import PAGE_SIZE
+
+
+# The interval at which the memory of a build is checked, in seconds
+POLL_INTERVAL = 0.2
+
+# The line printed by multilocale after each locale, followed by the locale and the exit status
+LOCALE_MARKER = 'vizir-locale-status'
+
+# The directory of the vzr package, which the builds may run modules of
+APP_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def group_rss(pgid):
+    """
+    Get the resident set size of the processes of a process group, from /proc
+    :param pgid: The process group ID
+    :return: The resident set size in bytes, 0 if it cannot be measured
+    """
+    total = 0
+    try:
+        pids = [pid for pid in os.listdir('/proc') if pid.isdigit()]
+    except FileNotFoundError:
+        return 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/stat', 'r', encoding='utf8') as file:
+                # The command name may contain spaces, but it is followed by the last parenthesis
+                fields = file.read().rsplit(')', 1)[1].split()
+            if int(fields[2]) != pgid:
+                continue
+            with open(f'/proc/{pid}/statm', 'r', encoding='utf8') as file:
+                total += int(file.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+def build_arguments(locale, main=False, cache_dir=None, jobs=1):
+    """
+    Get the Sphinx arguments to build a locale from the documentation directory
+    :param locale: The locale
+    :param main: Whether the locale is the main one
+    :param cache_dir: The project cache directory keeping the doctrees, if any, otherwise they are
+                      kept next to the output directory
+    :param jobs: The number of Sphinx processes, or 'auto'
+    """
+    arguments = ['.', os.path.join('..', '.build', locale), '-d',
+                 doctrees_dir(cache_dir, locale) if cache_dir else
+                 os.path.join('..', '.doctrees', locale)]
+    if jobs != 1:
+        arguments += ['-j', str(jobs)]
+    return arguments if main else arguments + ['-D', f'language={locale}']
+
+
+def run_build(docs_dir, arguments, memory=0, timeout=0, module='sphinx'):
+    """
+    Run Sphinx in a subprocess of its own process group, which is killed if it uses too much
+    memory or time, so that the memory of the imported modules is released after each build
+    :param docs_dir: The documentation directory, in which Sphinx is run
+    :param arguments: The arguments of the module
+    :param memory: The maximum resident set size of the build and its workers, in MB (0 for no
+                   limit)
+    :param timeout: The maximum duration of the build, in seconds (0 for no limit)
+    :param module: The module run, either sphinx or vzr.multilocale
+    :return: A (status, output, reason, peak_rss) tuple, the reason explaining why the build was
+             killed if it was, and peak_rss being the largest resident set size of the build and its
+             workers measured while polling them, in kB
+    """
+    # pylint: disable=R1732
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [APP_DIR, env.get('PYTHONPATH')]))
+    process = subprocess.Popen([sys.executable, '-m', module] + arguments, cwd=docs_dir, env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               stdin=subprocess.DEVNULL, start_new_session=True,
+                               encoding='utf8', errors='replace')
+    output = []
+    reader = threading.Thread(target=lambda: output.extend(process.stdout), daemon=True)
+    reader.start()
+
+    start = time.monotonic()
+    reason = None
+    peak = 0
+    while reason is None:
+        try:
+            process.wait(POLL_INTERVAL)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        rss = group_rss(process.pid)
+        peak = max(peak, rss)
+        if timeout and time.monotonic() - start > timeout:
+            reason = f'timed out after {timeout} s'
+        elif memory and rss > memory * 1024 * 1024:
+            reason = f'exceeded the memory limit of {memory} MB'
+    if reason:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    status = process.wait()
+    reader.join()
+    process.stdout.close()
+    return status, ''.join(output), reason, peak // 1024
@@ -0,0 +1,139 @@
+"""This module records the completed stages of a project, so that a failed run can be resumed"""
+
+
+import os
+import json
+import shutil
+import hashlib
+import threading
+
+from .constants import VERSION
+
+
+def checkpoint_path(project_dir):
+    """
+    Get the path of the checkpoint manifest of a project, next to the project directory so that
+    it is not taken for a staged file
+    :param project_dir: The project directory
+    """
+    return f'{os.path.normpath(project_dir)}.checkpoint.json'
+
+
+def conf_key(conf):
+    """
+    Compute the key of a project configuration, a checkpoint only being resumed by a run with the
+    same configuration and Vizir version
+    :param conf: The project configuration
+    """
+    return hashlib.sha256(json.dumps([VERSION, conf], sort_keys=True, default=str)
+                          .encode('utf8')).hexdigest()
+
+
+def clear(paths):
+    """
+    Remove the outputs of a stage which did not complete
+    :param paths: The paths of the files or directories
+    """
+    for path in paths:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        elif os.path.lexists(path):
+            os.remove(path)
+
+
+class Checkpoint:
+    """
+    The completed stages of a project, each with the paths of its outputs and the stages it
+    depends on. A stage is complete if it was recorded, its outputs still exist and the stages it
+    depends on are complete too.
+    """
+
+    def __init__(self, project_dir, conf, resume=False):
+        """
+        :param project_dir: The project directory
+        :param conf: The project configuration
+        :param resume: Whether to load the stages recorded by a previous run
+        """
+        self.path = checkpoint_path(project_dir)
+        self.key = conf_key(conf)
+        self.stages = {}
+        self.kept = set()
+        self.run = set()
+        self.lock = threading.Lock()
+        if resume:
+            try:
+                with open(self.path, 'r', encoding='utf8') as file:
+                    data = json.load(file)
+                if data.get('key') == self.key:
+                    self.stages = data['stages']
+            except (FileNotFoundError, ValueError, KeyError):
+                pass
+
+    def save(self):
+        """Write the manifest, replacing the previous one atomically"""
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(f'{self.path}.tmp', 'w', encoding='utf8') as file:
+                json.dump({'key': self.key, 'stages': self.stages}, file, indent=2)
+            os.replace(f'{self.path}.tmp', self.path)
+
+    def complete(self, stage):
+        """
+        Tell whether a stage is complete, forgetting it otherwise since it is going to run again
+        :param stage: The stage name
+        """
+        if stage in self.kept:
+            return True
+        if stage in self.run:
+            # The stage is complete once run again
+            return stage in self.stages
+        entry = self.stages.get(stage)
+        if entry is not None and all(os.path.exists(path) for path in entry['outputs']) and \
+                all(self.complete(dependency) and dependency not in self.run
+                    for dependency in entry['after']):
+            self.kept.add(stage)
+            return True
+        self.run.add(stage)
+        if entry is not None:
+            # The outputs may be overwritten from now on
+            with self.lock:
+                del self.stages[stage]
+            self.save()
+        return False
+
+    def forget(self, stages):
+        """
+        Forget some recorded stages, so that they run again along with the stages depending on them
+        :param stages: The stage names
+        """
+        with self.lock:
+            forgotten = [stage for stage in stages if self.stages.pop(stage, None) is not None]
+        if forgotten:
+            self.save()
+
+    def record(self, stage, outputs=(), after=()):
+        """
+        Record a completed stage
+        :param stage: The stage name
+        :param outputs: The paths of the files or directories written by the stage
+        :param after: The stages whose outputs the stage used
+        """
+        with self.lock:
+            self.stages[stage] = {'outputs': [os.path.abspath(path) for path in outputs],
+                                  'after': list(after)}
+        self.save()
+
+    def execute(self, stage, outputs, after, func, *args):
+        """
+        Run a stage from scratch, removing its previous outputs, and record it once complete
+        :param stage: The stage name
+        :param outputs: The paths of the files or directories written by the stage
+        :param after: The stages whose outputs the stage uses
+        :param func: The function running the stage
+        :param args: The arguments of the function
+        :return: The result of the function
+        """
+        clear(outputs)
+        result = func(*args)
+        self.record(stage, outputs, after)
+        return result
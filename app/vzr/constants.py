@@ -1,7 +1,9 @@
 """This module provides the constants for Vizir"""
 
 
-from .yava.primitives import is_str, is_str_or_number
+import os
+
+from .yava.primitives import is_job_count, is_str, is_str_or_number
 
 
 FILES_POLICY = {'_error':   {'@'},
@@ -21,6 +23,7 @@ POLICIES = {'*': {'_error':    {'@', 'repo', 'version'},
                                      }
                                },
                   'copyright': is_str,
+                  'jobs':      is_job_count,
                   'docs':      {'_error': {'@'},
                                 'files':  [FILES_POLICY],
                                 'from': is_str
@@ -32,6 +35,10 @@ POLICIES = {'*': {'_error':    {'@', 'repo', 'version'},
                  }
            }
 
+VERSION = '1.0'
+
 ENDPOINT = 'git.resel.fr'
-REMOTE = f'ssh://{ENDPOINT}:43000/{{}}'
+REMOTE = os.environ.get('VIZIR_REMOTE', f'ssh://{ENDPOINT}:43000/{{}}')
+GITLAB_URL = os.environ.get('VIZIR_GITLAB_URL', f'https://{ENDPOINT}')
 PRIVATE_TOKEN = '$PRIVATE_TOKEN'
+CACHE_DIR = os.environ.get('VIZIR_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'vizir'))
@@ -0,0 +1,220 @@
+"""This module provides a long-running build daemon fed with push notifications"""
+
+
+import os
+import json
+import shutil
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from git import Repo
+
+from .constants import CACHE_DIR, REMOTE
+from .mirrors import FETCHED
+from .processor import md5_hash, process
+from .util import buffered, header, info, mag, warn
+
+
+TOKEN_VARIABLE = 'VIZIR_SERVE_TOKEN'
+
+
+def warm_up():
+    """Do nothing, so that a worker process is started with the modules already loaded"""
+    return os.getpid()
+
+
+def build(repo_path, options):
+    # pylint: disable=W0703
+    """
+    Check out a repository and process its Vizir file, in a worker
+    :param repo_path: The repository path
+    :param options: The processing options
+    :return: An (output, status) tuple, the status being 0 on success
+    """
+    workspace = os.path.join(CACHE_DIR, 'serve', md5_hash(repo_path))
+    # The mirrors must be fetched again for every build
+    FETCHED.clear()
+    status = 0
+    with buffered() as buffer:
+        try:
+            shutil.rmtree(workspace, ignore_errors=True)
+            os.makedirs(os.path.dirname(workspace), exist_ok=True)
+            Repo.clone_from(REMOTE.format(repo_path), workspace, depth=1)
+            # The local resources are looked up in the current directory
+            os.chdir(workspace)
+            process(workspace, **options)
+        except Exception:
+            traceback.print_exc()
+            status = 1
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        finally:
+            os.chdir(os.path.dirname(workspace))
+            shutil.rmtree(workspace, ignore_errors=True)
+    return buffer.getvalue(), status
+
+
+class BuildQueue:
+    """
+    This class represents the queue of the builds. A repository is built at most once at a time,
+    and the pushes received while its build is queued are coalesced into that build.
+    :param workers: The number of worker processes
+    :param options: The processing options
+    """
+    def __init__(self, workers, options):
+        self.workers = workers
+        self.options = options
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.queued = OrderedDict()
+        self.running = set()
+        self.condition = threading.Condition()
+        self.stats = {'received': 0, 'coalesced': 0, 'built': 0, 'failed': 0}
+        # Start the workers now rather than on the first push
+        for future in [self.executor.submit(warm_up) for _ in range(workers)]:
+            future.result()
+        threading.Thread(target=self.dispatch, daemon=True).start()
+
+    def push(self, repo_path):
+        """
+        Queue a build of a repository, unless one is already queued
+        :param repo_path: The repository path
+        :return: Whether the push was coalesced into an already queued build
+        """
+        with self.condition:
+            self.stats['received'] += 1
+            if repo_path in self.queued:
+                self.stats['coalesced'] += 1
+                return True
+            self.queued[repo_path] = True
+            self.condition.notify()
+            return False
+
+    def status(self):
+        """Get the state of the queue"""
+        with self.condition:
+            return {'queued': list(self.queued), 'running': sorted(self.running), **self.stats}
+
+    def ready(self):
+        """List the queued repositories which can be built now"""
+        if len(self.running) >= self.workers:
+            return []
+        return [repo for repo in self.queued if repo not in self.running]
+
+    def dispatch(self):
+        """
+        Submit the queued builds whose repository is not already being built, as workers become
+        available so that the builds stay in the queue, where they can be coalesced
+        """
+        while True:
+            with self.condition:
+                ready = self.ready()
+                while not ready:
+                    self.condition.wait()
+                    ready = self.ready()
+                repo_path = ready[0]
+                del self.queued[repo_path]
+                self.running.add(repo_path)
+            info(f'Building {mag(repo_path)}')
+            future = self.executor.submit(build, repo_path, self.options)
+            future.add_done_callback(lambda future, repo_path=repo_path:
+                                     self.done(repo_path, future))
+
+    def done(self, repo_path, future):
+        """
+        Report a finished build
+        :param repo_path: The repository path
+        :param future: The future of the build
+        """
+        try:
+            output, status = future.result()
+        except Exception as e:  # pylint: disable=W0703
+            output, status = f'{type(e).__name__}: {e}\n', 1
+        print(output, end='')
+        (warn if status else info)(f'Build of {mag(repo_path)} exited with status '
+                                   f'{mag(str(status))}')
+        with self.condition:
+            self.running.discard(repo_path)
+            self.stats['failed' if status else 'built'] += 1
+            self.condition.notify()
+
+
+def push_path(payload):
+    """
+    Get the repository path of a push notification, either a GitLab push event or a
+    {"repository": <path>} object
+    :param payload: The decoded notification
+    """
+    if 'project' in payload:
+        return payload['project'].get('path_with_namespace')
+    return payload.get('repository')
+
+
+def handler(queue):
+    """
+    Create the request handler class of a build queue
+    :param queue: The build queue
+    """
+    class Handler(BaseHTTPRequestHandler):
+        """This class handles the push notifications and the status requests"""
+        def reply(self, code, body):
+            """Send a JSON reply"""
+            data = json.dumps(body).encode('utf8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            # pylint: disable=C0103
+            """Report the state of the queue"""
+            if self.path != '/status':
+                return self.reply(404, {'error': 'Not found'})
+            return self.reply(200, queue.status())
+
+        def do_POST(self):
+            # pylint: disable=C0103
+            """Queue a build for a push notification"""
+            if self.path != '/push':
+                return self.reply(404, {'error': 'Not found'})
+            token = os.environ.get(TOKEN_VARIABLE)
+            if token and self.headers.get('X-Gitlab-Token') != token:
+                return self.reply(403, {'error': 'Invalid token'})
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                repo_path = push_path(json.loads(self.rfile.read(length)))
+            except (ValueError, AttributeError):
+                repo_path = None
+            if not repo_path:
+                return self.reply(400, {'error': 'No repository in the notification'})
+            return self.reply(202, {'repository': repo_path, 'coalesced': queue.push(repo_path)})
+
+        def log_message(self, format, *args):
+            # pylint: disable=W0622
+            """Silence the request logs"""
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=8000, workers=1, **options):
+    """
+    Run the build daemon
+    :param host: The address to listen on
+    :param port: The port to listen on
+    :param workers: The number of worker processes
+    :param options: The processing options, see processor.process
+    """
+    header('Vizir Daemon')
+    queue = BuildQueue(workers, options)
+    server = ThreadingHTTPServer((host, port), handler(queue))
+    info(f'Listening on {mag(f"http://{host}:{port}")} with {mag(str(workers))} workers')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        queue.executor.shutdown(cancel_futures=True)
@@ -0,0 +1,138 @@
+"""This module moves the assets shared by the locales of a project into a single directory"""
+
+
+import os
+import re
+import shutil
+import hashlib
+import posixpath
+
+from .checkpoint import clear
+
+
+SHARED_DIR = '_shared'
+ASSET_DIRS = ('_static', '_images')
+
+# The references of the HTML pages to the assets, the page depth being given by the ../ prefix
+REFERENCE = re.compile(r'''(?P<attr>(?:href|src)=["'])(?P<up>(?:\.\./)*)'''
+                       r'''(?P<path>(?:_static|_images)/[^"'?#]+)''')
+CSS_URL = re.compile(r'''url\(\s*["']?([^"')?#]+)''')
+
+
+def asset_hashes(locale_dir):
+    """
+    Hash the assets of a locale
+    :param locale_dir: The output directory of the locale
+    :return: The hashes, by path relative to the locale directory
+    """
+    hashes = {}
+    for asset_dir in ASSET_DIRS:
+        for root, _, files in os.walk(os.path.join(locale_dir, asset_dir)):
+            for name in files:
+                path = os.path.join(root, name)
+                if os.path.islink(path):
+                    continue
+                with open(path, 'rb') as file:
+                    relative = os.path.relpath(path, locale_dir).replace(os.sep, '/')
+                    hashes[relative] = hashlib.sha1(file.read()).hexdigest()
+    return hashes
+
+
+def css_references(locale_dir, path):
+    """
+    List the assets referenced by a stylesheet
+    :param locale_dir: The output directory of the locale
+    :param path: The stylesheet path, relative to the locale directory
+    """
+    with open(os.path.join(locale_dir, path), 'r', encoding='utf8', errors='replace') as file:
+        content = file.read()
+    return {posixpath.normpath(posixpath.join(posixpath.dirname(path), url))
+            for url in CSS_URL.findall(content) if ':' not in url and not url.startswith('/')}
+
+
+def shared_assets(build_dir, locales):
+    """
+    Find the assets which are identical in every locale. The relative references of the
+    stylesheets must keep working, so an asset referenced by a stylesheet which is not shared is
+    not shared either, and a shared stylesheet referencing an asset which is not shared is not
+    shared either.
+    :param build_dir: The output directory
+    :param locales: The locales
+    """
+    hashes = [asset_hashes(os.path.join(build_dir, locale)) for locale in locales]
+    shared = {path for path, digest in hashes[0].items()
+              if all(other.get(path) == digest for other in hashes[1:])}
+    references = [(path, css_references(os.path.join(build_dir, locale), path) & set(locale_hashes))
+                  for locale, locale_hashes in zip(locales, hashes)
+                  for path in locale_hashes if path.endswith('.css')]
+    while True:
+        kept = set()
+        for path, referenced in references:
+            if path not in shared:
+                kept |= referenced
+            elif referenced - shared:
+                kept.add(path)
+        if not kept & shared:
+            return shared
+        shared -= kept
+
+
+def rewrite_page(path, shared):
+    """
+    Point the references of an HTML page to the shared assets
+    :param path: The page path
+    :param shared: The shared assets
+    """
+    with open(path, 'r', encoding='utf8', errors='surrogateescape') as file:
+        content = file.read()
+
+    def replace(match):
+        if match.group('path') not in shared:
+            return match.group(0)
+        return f'{match.group("attr")}{match.group("up")}../{SHARED_DIR}/{match.group("path")}'
+
+    rewritten = REFERENCE.sub(replace, content)
+    if rewritten != content:
+        with open(path, 'w', encoding='utf8', errors='surrogateescape') as file:
+            file.write(rewritten)
+
+
+def dedupe(build_dir, locales):
+    """
+    Move the assets identical in every locale into the shared directory of the output directory,
+    and point the pages to them
+    :param build_dir: The output directory
+    :param locales: The locales
+    :return: A (count, size) tuple, the number of shared assets and the bytes saved
+    """
+    shared = shared_assets(build_dir, locales)
+    saved = 0
+    for path in sorted(shared):
+        destination = os.path.join(build_dir, SHARED_DIR, path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        for i, locale in enumerate(locales):
+            source = os.path.join(build_dir, locale, path)
+            if i == 0:
+                shutil.move(source, destination)
+            else:
+                saved += os.path.getsize(source)
+                os.remove(source)
+    for locale in locales:
+        for root, _, files in os.walk(os.path.join(build_dir, locale)):
+            for name in files:
+                if name.endswith('.html'):
+                    rewrite_page(os.path.join(root, name), shared)
+    return len(shared), saved
+
+
+def discard(build_dir, locales, checkpoint):
+    """
+    Remove the output of the locales if the resumed run stopped while their assets were being
+    moved into the shared directory, so that they are built again
+    :param build_dir: The output directory
+    :param locales: The locales
+    :param checkpoint: The checkpoint of the project
+    """
+    shared_dir = os.path.join(build_dir, SHARED_DIR)
+    if 'assets' not in checkpoint.stages and os.path.exists(shared_dir):
+        clear([shared_dir] + [os.path.join(build_dir, locale) for locale in locales])
@@ -0,0 +1,64 @@
+"""This module evaluates the expression lists of the templates once, when generating conf.py"""
+
+
+import os
+import importlib
+from fnmatch import fnmatchcase
+from functools import partial
+
+
+# The names of the directories which are not walked into by default
+DEFAULT_EXCLUDE = ('.*', 'node_modules')
+
+
+def directories(top, exclude=DEFAULT_EXCLUDE):
+    """
+    List a directory and its subdirectories, without walking into the excluded ones
+    :param top: The directory
+    :param exclude: The glob patterns of the names of the excluded directories
+    :return: The set of the directory paths, starting with top
+    """
+    found = set()
+    stack = [top]
+    while stack:
+        path = stack.pop()
+        found.add(path)
+        try:
+            entries = os.scandir(path)
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False) and \
+                        not any(fnmatchcase(entry.name, pattern) for pattern in exclude):
+                    stack.append(os.path.join(path, entry.name))
+    return found
+
+
+def evaluate(expr_lists, imports, variables, base_dir, exclude=DEFAULT_EXCLUDE):
+    # pylint: disable=R0913,W0123
+    """
+    Evaluate expression lists as conf.py would, from the documentation directory
+    :param expr_lists: The expressions, by name
+    :param imports: The names of the modules imported by conf.py
+    :param variables: The variables defined by conf.py before the expression lists
+    :param base_dir: The directory the expressions are evaluated in
+    :param exclude: The glob patterns of the directories skipped by directories()
+    :return: The values, by name, as lists sorted when the expressions give sets
+    """
+    namespace = {}
+    for name in imports:
+        # Like the import statement, bind the top-level package of a submodule
+        importlib.import_module(name)
+        namespace[name.split('.')[0]] = importlib.import_module(name.split('.')[0])
+    namespace.update(variables)
+    namespace['directories'] = partial(directories, exclude=tuple(exclude))
+    cwd = os.getcwd()
+    os.chdir(base_dir)
+    try:
+        values = {name: eval(expression, dict(namespace))
+                  for name, expression in expr_lists.items()}
+    finally:
+        os.chdir(cwd)
+    return {name: sorted(value) if isinstance(value, (set, frozenset)) else list(value)
+            for name, value in values.items()}
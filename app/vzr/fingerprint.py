@@ -0,0 +1,47 @@
+"""This module fingerprints the inputs of a project to skip the builds which would change nothing"""
+
+
+import os
+import json
+import hashlib
+
+from git import GitCommandError
+
+
+MANIFEST = '.vizir.json'
+
+
+def compute_fingerprint(hashes, inputs):
+    """
+    Computes the fingerprint of the inputs of a project
+    :param hashes: The hashes of the staged files
+    :param inputs: The other inputs, as a JSON-serializable dictionary
+    """
+    sha256 = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf8'))
+    for name in sorted(hashes):
+        sha256.update(f'{name}\0{hashes[name]}\n'.encode('utf8'))
+    return sha256.hexdigest()
+
+
+def read_manifest(build_repo):
+    """
+    Read the manifest of the last build from the target repository
+    :param build_repo: The target repository
+    :return: The manifest, or an empty dictionary if there is none
+    """
+    try:
+        return json.loads(build_repo.git.show(f'HEAD:{MANIFEST}'))
+    except (GitCommandError, ValueError):
+        return {}
+
+
+def write_manifest(build_dir, fingerprint, inputs):
+    """
+    Write the manifest of the current build in the target repository
+    :param build_dir: The target repository directory
+    :param fingerprint: The fingerprint of the inputs
+    :param inputs: The other inputs
+    """
+    with open(os.path.join(build_dir, MANIFEST), 'w', encoding='utf8') as file:
+        json.dump({'fingerprint': fingerprint, 'inputs': inputs}, file, indent=2, sort_keys=True)
+        file.write('\n')
@@ -0,0 +1,167 @@
+"""This module provides a shared GitLab client with a cache of the existing groups and projects"""
+
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from gitlab import Gitlab, GitlabGetError
+
+from .constants import CACHE_DIR, GITLAB_URL, PRIVATE_TOKEN
+
+
+POOL_SIZE = 16
+CACHE_FILE = os.path.join(CACHE_DIR, 'gitlab.json')
+
+# The shared client, created on first use
+CLIENT = None
+# The IDs of the groups and projects known to exist, with the time they were looked up at
+CACHE = {'groups': {}, 'projects': {}}
+# The time during which the cache is kept on disk, in seconds (0 to only keep it in memory)
+TTL = 0
+
+
+def client():
+    """Get the GitLab client shared by the whole run, authenticating it on first use"""
+    global CLIENT  # pylint: disable=W0603
+    if CLIENT is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        CLIENT = Gitlab(GITLAB_URL, private_token=PRIVATE_TOKEN, session=session)
+        CLIENT.auth()
+    return CLIENT
+
+
+def reset(cache):
+    """
+    Forget the inherited client and use the given cache, in a newly started worker process
+    :param cache: The cache
+    """
+    global CLIENT, CACHE  # pylint: disable=W0603
+    CLIENT = None
+    CACHE = cache
+
+
+def merge(cache):
+    """
+    Add the groups and projects looked up by a worker process to the cache of the run
+    :param cache: The cache of the worker
+    """
+    for kind, entries in cache.items():
+        for path, entry in entries.items():
+            if path not in CACHE[kind] or CACHE[kind][path][1] < entry[1]:
+                CACHE[kind][path] = entry
+
+
+def load_cache(ttl=0):
+    """
+    Load the entries of the on-disk cache which are not expired
+    :param ttl: The time during which the cache is kept on disk, in seconds (0 to disable it)
+    """
+    global TTL  # pylint: disable=W0603
+    TTL = ttl
+    if not ttl:
+        return
+    try:
+        with open(CACHE_FILE, 'r', encoding='utf8') as file:
+            cache = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return
+    now = time.time()
+    for kind, entries in CACHE.items():
+        entries.update({path: entry for path, entry in cache.get(kind, {}).items()
+                        if now - entry[1] < ttl})
+
+
+def save_cache():
+    """Save the cache on disk if enabled"""
+    if TTL:
+        os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+        with open(CACHE_FILE, 'w', encoding='utf8') as file:
+            json.dump(CACHE, file)
+
+
+def remember(kind, path, ident):
+    """
+    Remember that a group or a project exists
+    :param kind: Either 'groups' or 'projects'
+    :param path: The group or project path
+    :param ident: The group or project ID
+    """
+    CACHE[kind][path] = (ident, time.time())
+    return ident
+
+
+def lookup_project(repo_path, gitlab):
+    """
+    Look a project up, remembering it if it exists
+    :param repo_path: The project path
+    :param gitlab: The Gitlab object
+    :return: The project ID, or None if it does not exist
+    """
+    if repo_path in CACHE['projects']:
+        return CACHE['projects'][repo_path][0]
+    try:
+        return remember('projects', repo_path, gitlab.projects.get(repo_path).id)
+    except GitlabGetError:
+        return None
+
+
+def prefetch(repo_paths, gitlab):
+    """
+    Look several projects up concurrently
+    :param repo_paths: The project paths
+    :param gitlab: The Gitlab object
+    :return: The paths of the projects which do not exist
+    """
+    paths = sorted(set(repo_paths) - set(CACHE['projects']))
+    with ThreadPoolExecutor(max_workers=min(POOL_SIZE, len(paths) or 1)) as executor:
+        idents = list(executor.map(lambda path: lookup_project(path, gitlab), paths))
+    return [path for path, ident in zip(paths, idents) if ident is None]
+
+
+def touch_project(project_name, repo_path, gitlab):
+    """
+    Touches a project
+    :param project_name: The project name
+    :param repo_path: The project path
+    :param gitlab: The Gitlab object
+    """
+    if lookup_project(repo_path, gitlab) is None:
+        create_project(project_name, repo_path.split('/'), gitlab)
+
+
+def get_group(group_path_parts, gitlab):
+    """
+    Get a group ID from a path. If the group or its parents don't exist, create them.
+    :param group_path_parts: The path parts
+    :param gitlab: The Gitlab object
+    """
+    path = '/'.join(group_path_parts)
+    if path in CACHE['groups']:
+        return CACHE['groups'][path][0]
+    try:
+        return remember('groups', path, gitlab.groups.get(path).id)
+    except GitlabGetError:
+        parent_id = get_group(group_path_parts[:-1], gitlab)
+        name = group_path_parts[-1]
+        group = gitlab.groups.create({'name': name, 'path': name, 'parent_id': parent_id})
+        return remember('groups', path, group.id)
+
+
+def create_project(project_name, project_path_parts, gitlab):
+    """
+    Create a GitLab project
+    :param project_name: The project name
+    :param project_path_parts: The path parts
+    :param gitlab: The Gitlab object
+    """
+    group_id = get_group(project_path_parts[:-1], gitlab)
+    project = gitlab.projects.create({'name': project_name, 'path': project_path_parts[-1],
+                                      'namespace_id': group_id})
+    remember('projects', '/'.join(project_path_parts), project.id)
@@ -0,0 +1,244 @@
+"""This module keeps the history of the runs in a SQLite database, to follow the duration of each
+step over time and find the ones which regressed"""
+
+
+import os
+import re
+import json
+import sqlite3
+import statistics
+
+from .constants import CACHE_DIR, VERSION
+from .util import header, info, mag, warn, Section
+
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, 'history.sqlite')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY, started REAL, directory TEXT, version TEXT, status INTEGER,
+    duration REAL, options TEXT);
+CREATE TABLE IF NOT EXISTS projects (
+    run INTEGER REFERENCES runs(id), project TEXT, failed INTEGER, duration REAL,
+    output_size INTEGER, output_files INTEGER);
+CREATE TABLE IF NOT EXISTS stages (
+    run INTEGER REFERENCES runs(id), project TEXT, stage TEXT, category TEXT, duration REAL,
+    cpu REAL, peak_rss INTEGER, failed INTEGER);
+CREATE TABLE IF NOT EXISTS cache (
+    run INTEGER REFERENCES runs(id), name TEXT, value INTEGER);
+CREATE INDEX IF NOT EXISTS stages_by_name ON stages (project, stage, run);
+'''
+
+# The prefix of the sections of the projects
+PROJECT_PREFIX = 'Project '
+
+# The section printing the slowest steps at the end of a run, which is not a stage
+SUMMARY_SECTION = 'Slowest steps'
+
+# The names of the steps depending on the locales built in the run, and their stable names
+STABLE_NAMES = ((re.compile(r'Storing the .+ in the artifact cache'),
+                 'Storing the locales in the artifact cache'),
+                (re.compile(r'Generating documentation for the .+, .+ locales'),
+                 'Generating documentation for the locales'))
+
+# The percentiles printed by stats
+PERCENTILES = (50, 90, 95)
+
+
+def connect(path=None):
+    """
+    Open the history database, creating it if needed
+    :param path: The database path, DEFAULT_PATH by default
+    """
+    path = path or DEFAULT_PATH
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def stable_name(name):
+    """
+    Get the name of a step which is the same from a run to another
+    :param name: The step name
+    """
+    for pattern, stable in STABLE_NAMES:
+        if pattern.fullmatch(name):
+            return stable
+    return name
+
+
+def stage_rows(events, directory):
+    """
+    Convert the spans of a run to stages, each stage being named after its enclosing sections
+    within its project, and the paths of the processed directory and the locales built in the run
+    being removed so that the names of the stages are the same from a run to another
+    :param events: The spans, see tracing
+    :param directory: The processed directory
+    :return: The (project, stage, category, duration, cpu, peak RSS, failed) tuples
+    """
+    rows = []
+    for event in events:
+        path = event['args']['path']
+        if (path[0] if path else event['name']) == SUMMARY_SECTION:
+            continue
+        project = ''
+        if path and path[0].startswith(PROJECT_PREFIX):
+            project, path = path[0][len(PROJECT_PREFIX):], path[1:]
+        elif not path and event['name'].startswith(PROJECT_PREFIX):
+            project = event['name'][len(PROJECT_PREFIX):]
+        stage = ' > '.join(path + [stable_name(event['name'])]).replace(directory + os.sep, '')
+        rows.append((project, stage, event['cat'], event['dur'] / 1e6, event['args']['cpu'],
+                     event['args']['peak_rss'], int(event['args']['failed'])))
+    return rows
+
+
+def record(path, run, events, outputs, cache):
+    # pylint: disable=R0913
+    """
+    Record a run
+    :param path: The database path, DEFAULT_PATH if empty
+    :param run: The 'started' time, 'directory', 'status', 'duration' and 'options' of the run
+    :param events: The spans recorded during the run, see tracing
+    :param outputs: The (size, files) tuples of the output of the projects, by project
+    :param cache: The statistics of the artifact cache, by name
+    :return: The ID of the run
+    """
+    rows = stage_rows(events, run['directory'])
+    with connect(path) as connection:
+        run_id = connection.execute(
+            'INSERT INTO runs (started, directory, version, status, duration, options) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (run['started'], run['directory'], VERSION, run['status'], run['duration'],
+             json.dumps(run['options'], sort_keys=True, default=str))).lastrowid
+        sections = {row[0]: row for row in rows if row[2] == 'section' and row[0] and
+                    row[1] == f'{PROJECT_PREFIX}{row[0]}'}
+        connection.executemany(
+            'INSERT INTO projects VALUES (?, ?, ?, ?, ?, ?)',
+            [(run_id, project, sections[project][6] if project in sections else None,
+              sections[project][3] if project in sections else None, size, files)
+             for project, (size, files) in outputs.items()])
+        connection.executemany('INSERT INTO stages VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                               [(run_id, *row) for row in rows])
+        connection.executemany('INSERT INTO cache VALUES (?, ?, ?)',
+                               [(run_id, name, value) for name, value in cache.items()])
+    connection.close()
+    return run_id
+
+
+def percentile(values, percent):
+    """
+    Compute a percentile, interpolating between the closest ranks
+    :param values: The sorted values
+    :param percent: The percentile, between 0 and 100
+    """
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def stage_history(connection, runs, project=None):
+    """
+    Get the durations of the stages in the last runs
+    :param connection: The database connection
+    :param runs: The number of runs
+    :param project: The project whose stages are considered, all of them if None
+    :return: A (durations, latest) tuple, the durations being in the order of the runs by
+             (project, stage), and latest being the stages of the last run
+    """
+    query = ('SELECT run, project, stage, duration FROM stages WHERE run IN '
+             '(SELECT id FROM runs ORDER BY id DESC LIMIT ?) AND NOT failed')
+    parameters = [runs]
+    if project is not None:
+        query += ' AND project = ?'
+        parameters.append(project)
+    durations = {}
+    last_runs = {}
+    for run, name, stage, duration in connection.execute(query + ' ORDER BY run', parameters):
+        durations.setdefault((name, stage), []).append(duration)
+        last_runs[(name, stage)] = run
+    last = max(last_runs.values(), default=None)
+    return durations, {key for key, run in last_runs.items() if run == last}
+
+
+def regressions(durations, latest, window=10, threshold=0.3, minimum=0.5):
+    """
+    Find the stages of the last run whose duration regressed against their rolling baseline, the
+    median of their previous durations
+    :param durations: The durations in the order of the runs, by (project, stage)
+    :param latest: The stages of the last run
+    :param window: The number of previous durations making the baseline
+    :param threshold: The relative slowdown from which a stage regressed
+    :param minimum: The duration under which a stage is too short to be compared, in seconds
+    :return: The (project, stage, baseline, last duration) tuples, the worst first
+    """
+    found = []
+    for (project, stage), values in durations.items():
+        if (project, stage) not in latest or len(values) < 3:
+            continue
+        baseline = statistics.median(values[-window - 1:-1])
+        if values[-1] >= minimum and values[-1] > baseline * (1 + threshold):
+            found.append((project, stage, baseline, values[-1]))
+    return sorted(found, key=lambda row: -(row[3] / max(row[2], 1e-6)))
+
+
+def stats(path=None, project=None, runs=50, threshold=0.3, as_json=False):
+    # pylint: disable=R0914
+    """
+    Print the percentiles of the duration of the stages over the last runs, and the stages which
+    regressed in the last one
+    :param path: The database path, DEFAULT_PATH by default
+    :param project: The project whose stages are printed, all of them if None
+    :param runs: The number of runs considered
+    :param threshold: The relative slowdown from which a stage regressed
+    :param as_json: Whether to print the statistics as JSON
+    """
+    connection = connect(path)
+    durations, latest = stage_history(connection, runs, project)
+    count = connection.execute('SELECT COUNT(*) FROM (SELECT id FROM runs ORDER BY id DESC '
+                               'LIMIT ?)', (runs,)).fetchone()[0]
+    cache = dict(connection.execute('SELECT name, SUM(value) FROM cache WHERE run IN '
+                                    '(SELECT id FROM runs ORDER BY id DESC LIMIT ?) '
+                                    'GROUP BY name', (runs,)))
+    connection.close()
+    summaries = {key: {'runs': len(values), 'last': round(values[-1], 3),
+                       **{f'p{percent}': round(percentile(sorted(values), percent), 3)
+                          for percent in PERCENTILES}}
+                 for key, values in durations.items()}
+    regressed = regressions(durations, latest, threshold=threshold)
+
+    if as_json:
+        print(json.dumps({'runs': count, 'cache': cache,
+                          'stages': [{'project': name, 'stage': stage, **summary}
+                                     for (name, stage), summary in sorted(summaries.items())],
+                          'regressions': [{'project': name, 'stage': stage, 'baseline': baseline,
+                                           'last': last}
+                                          for name, stage, baseline, last in regressed]},
+                         indent=2))
+        return
+
+    header('Vizir Stats')
+    info(f'{mag(str(count))} runs, {mag(str(len(durations)))} stages')
+    columns = ' '.join(f'{f"p{percent}":>8}' for percent in PERCENTILES)
+    for name in sorted({name for name, _ in summaries}):
+        with Section(f'Project {name}' if name else 'Run'):
+            info(f'{"runs":>5} {columns} {"last":>8}')
+            for (other, stage), summary in sorted(summaries.items(),
+                                                  key=lambda item: -item[1]['p50']):
+                if other == name:
+                    values = ' '.join(f'{summary[f"p{percent}"]:7.2f}s'
+                                      for percent in PERCENTILES)
+                    info(f'{summary["runs"]:5d} {values} {summary["last"]:7.2f}s  {mag(stage)}')
+    if cache:
+        with Section('Artifact cache'):
+            info(', '.join(f'{mag(str(value))} {name.replace("_", " ")}'
+                           for name, value in sorted(cache.items())))
+    if regressed:
+        with Section('Regressions'):
+            for name, stage, baseline, last in regressed:
+                suffix = f' ({mag(name)})' if name and stage != f'{PROJECT_PREFIX}{name}' else ''
+                warn(f'{mag(stage)}{suffix}: {last:.2f} s against '
+                     f'{baseline:.2f} s (+{(last / baseline - 1) * 100 if baseline else 0:.0f} %)')
+    else:
+        info('No stage regressed in the last run')
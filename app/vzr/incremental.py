@@ -0,0 +1,108 @@
+"""This module keeps the Sphinx environment between runs to allow incremental builds"""
+
+
+import os
+import json
+import hashlib
+
+from .constants import CACHE_DIR
+
+
+STAMPS = 'stamps.json'
+IGNORED_DIRS = {'.build', '.build.git', '.doctrees', '.sources'}
+
+
+def project_cache(repo_path):
+    """
+    Get the persistent cache directory of a project
+    :param repo_path: The path of the project's target repository
+    """
+    return os.path.join(CACHE_DIR, 'sphinx', hashlib.md5(repo_path.encode('utf8')).hexdigest())
+
+
+def doctrees_dir(cache_dir, locale):
+    """
+    Get the directory in which Sphinx keeps the doctrees and the environment pickle of a locale
+    :param cache_dir: The project cache directory
+    :param locale: The locale
+    """
+    return os.path.join(cache_dir, 'doctrees', locale)
+
+
+def file_hash(path):
+    """
+    Computes the SHA-1 hash of a file's content
+    :param path: The file path
+    """
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def staged_files(project_dir):
+    """
+    List the staged input files of a project, relatively to the project directory
+    :param project_dir: The project directory
+    """
+    for root, dirs, files in os.walk(project_dir):
+        if root == project_dir:
+            dirs[:] = [i for i in dirs if i not in IGNORED_DIRS]
+        for name in files:
+            yield os.path.relpath(os.path.join(root, name), project_dir)
+
+
+def staged_hashes(project_dir):
+    """
+    Computes the hashes of the staged input files of a project
+    :param project_dir: The project directory
+    :return: A dictionary associating the hashes to the paths relative to the project directory
+    """
+    return {name: file_hash(os.path.join(project_dir, name)) for name in staged_files(project_dir)}
+
+
+def private_file(path):
+    """
+    Tell whether a staged file is a file of its own, whose modification time can be changed
+    without changing the one of the source file, unlike a symlink or a hardlink
+    :param path: The file path
+    """
+    return not os.path.islink(path) and os.stat(path).st_nlink == 1
+
+
+def restore_stamps(project_dir, cache_dir, hashes=None):
+    """
+    Give the staged files whose content did not change since the last run their previous
+    modification time, so that Sphinx only reads the changed sources again. The other files are
+    touched so that Sphinx considers them as outdated. The files linked to the sources keep the
+    modification time of the sources, which is not changed.
+    :param project_dir: The project directory
+    :param cache_dir: The project cache directory
+    :param hashes: The hashes of the staged files, if already computed
+    :return: The number of unchanged files
+    """
+    if hashes is None:
+        hashes = staged_hashes(project_dir)
+    try:
+        with open(os.path.join(cache_dir, STAMPS), 'r', encoding='utf8') as file:
+            stamps = json.load(file)
+    except (FileNotFoundError, ValueError):
+        stamps = {}
+
+    new_stamps = {}
+    unchanged = 0
+    for name, digest in hashes.items():
+        path = os.path.join(project_dir, name)
+        if private_file(path):
+            if name in stamps and stamps[name][0] == digest:
+                os.utime(path, ns=(stamps[name][1], stamps[name][1]))
+                unchanged += 1
+            else:
+                os.utime(path)
+        new_stamps[name] = (digest, os.stat(path).st_mtime_ns)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, STAMPS), 'w', encoding='utf8') as file:
+        json.dump(new_stamps, file)
+    return unchanged
@@ -0,0 +1,144 @@
+"""This module keeps an index of the projects and sections using each source repository"""
+
+
+import os
+import glob
+import json
+
+from .constants import CACHE_DIR, VERSION
+from .util import header, info, mag, warn, Step
+from .validator import file_stamp, load
+
+
+INDEX_FILE = os.path.join(CACHE_DIR, 'index.json')
+
+
+def project_sources(conf):
+    """
+    List the source repositories of a project
+    :param conf: The project configuration
+    :return: The sections using each repository, by repository
+    """
+    sections = {}
+    if isinstance(conf.get('docs'), dict):
+        sections['docs'] = conf['docs']
+    if isinstance(conf.get('code'), dict):
+        sections.update({name: section for name, section in conf['code'].items()
+                         if isinstance(section, dict)})
+    sources = {}
+    for name, section in sections.items():
+        if isinstance(section.get('from'), str):
+            sources.setdefault(section['from'], []).append(name)
+    return sources
+
+
+def load_index(path=None):
+    """
+    Load the index, or an empty one if it does not exist or was written by another version
+    :param path: The index path, INDEX_FILE by default
+    """
+    try:
+        with open(path or INDEX_FILE, 'r', encoding='utf8') as file:
+            index = json.load(file)
+        if index.get('version') == VERSION:
+            return index
+    except (FileNotFoundError, ValueError):
+        pass
+    return {'version': VERSION, 'files': {}, 'sources': {}}
+
+
+def save_index(index, path=None):
+    """
+    Save the index, with its reverse mapping from the source repositories to the projects
+    :param index: The index
+    :param path: The index path, INDEX_FILE by default
+    """
+    sources = {}
+    for directory, entry in sorted(index['files'].items()):
+        for project, project_entry in sorted(entry['projects'].items()):
+            for repo, sections in sorted(project_entry['sources'].items()):
+                sources.setdefault(repo, []).append({'directory': directory, 'project': project,
+                                                     'sections': sections})
+    index['sources'] = dict(sorted(sources.items()))
+    path = path or INDEX_FILE
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf8') as file:
+        json.dump(index, file, indent=2)
+
+
+def update_index(index, directories):
+    """
+    Index the Vizir files of some directories, only parsing the files which changed since they
+    were last indexed, and forget the indexed files which no longer exist
+    :param index: The index
+    :param directories: The directories
+    :return: The number of files parsed
+    """
+    parsed = 0
+    for directory in list(index['files']):
+        if not os.path.isfile(os.path.join(directory, '.docs.yml')):
+            del index['files'][directory]
+    for directory in directories:
+        path = os.path.join(directory, '.docs.yml')
+        if not os.path.isfile(path):
+            continue
+        previous = index['files'].get(directory)
+        stamp = file_stamp(path, previous and previous['stamp'])
+        if previous and previous['stamp'][2] == stamp[2]:
+            previous['stamp'] = stamp
+            continue
+        try:
+            conf = load(path)
+        except Exception as e:  # pylint: disable=W0703
+            warn(f'Could not parse {mag(path)}: {e}')
+            continue
+        if not isinstance(conf, dict):
+            warn(f'{mag(path)} is not a Vizir file')
+            continue
+        index['files'][directory] = {'stamp': stamp, 'projects': {
+            project: {'repo': project_conf.get('repo'), 'sources': project_sources(project_conf)}
+            for project, project_conf in conf.items() if isinstance(project_conf, dict)}}
+        parsed += 1
+    return parsed
+
+
+def affected(repos, path=None):
+    """
+    Find the projects using some source repositories, refreshing the indexed files first
+    :param repos: The source repositories
+    :param path: The index path, INDEX_FILE by default
+    :return: The affected projects, by directory
+    """
+    index = load_index(path)
+    if update_index(index, list(index['files'])):
+        save_index(index, path)
+    projects = {}
+    for repo in repos:
+        for entry in index['sources'].get(repo, []):
+            projects.setdefault(entry['directory'], set()).add(entry['project'])
+    return {directory: sorted(names) for directory, names in sorted(projects.items())}
+
+
+def build_index(patterns, path=None, as_json=False):
+    """
+    Index the Vizir files of many directories
+    :param patterns: The directories or glob patterns of directories
+    :param path: The index path, INDEX_FILE by default
+    :param as_json: Whether to print the mapping from the source repositories to the projects
+                    as JSON instead of a summary
+    """
+    directories = sorted({os.path.abspath(directory) for pattern in patterns
+                          for directory in glob.glob(pattern) if os.path.isdir(directory)})
+    data = load_index(path)
+    if as_json:
+        update_index(data, directories)
+        save_index(data, path)
+        print(json.dumps(data['sources'], indent=2))
+        return
+    header('Vizir Index')
+    with Step(f'Indexing {mag(str(len(directories)))} directories', single_line=False):
+        parsed = update_index(data, directories)
+        save_index(data, path)
+    projects = sum(len(entry['projects']) for entry in data['files'].values())
+    info(f'{mag(str(parsed))} files parsed, {mag(str(len(data["sources"])))} source repositories '
+         f'used by {mag(str(projects))} projects in {mag(str(len(data["files"])))} files')
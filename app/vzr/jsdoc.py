@@ -0,0 +1,88 @@
+"""This module keeps the output of jsdoc in a content-addressed cache shared by the builds"""
+
+
+import os
+import re
+import time
+import hashlib
+
+from .constants import CACHE_DIR
+
+
+# The files parsed by jsdoc with its default configuration
+SOURCE_PATTERN = re.compile(r'\.js(doc|x)?$')
+
+# The entries of the cache which were not used for this long are removed, in seconds
+MAX_AGE = 30 * 24 * 3600
+
+
+def cache_dir():
+    """Get the directory of the jsdoc cache"""
+    return os.path.join(CACHE_DIR, 'jsdoc')
+
+
+def source_files(source_dir):
+    """
+    List the JavaScript files jsdoc reads in a directory, without walking into its subdirectories
+    :param source_dir: The directory
+    """
+    try:
+        names = sorted(os.listdir(source_dir))
+    except OSError:
+        return []
+    return [os.path.join(source_dir, name) for name in names
+            if SOURCE_PATTERN.search(name) and os.path.isfile(os.path.join(source_dir, name))]
+
+
+def cache_key(source_dirs, config_path=None):
+    """
+    Compute the key of the jsdoc output of some directories, which depends on the content of
+    their JavaScript files, on their absolute paths since jsdoc reports them, and on the jsdoc
+    configuration
+    :param source_dirs: The directories given to jsdoc
+    :param config_path: The path of the jsdoc configuration file, if any
+    """
+    sha256 = hashlib.sha256()
+    for source_dir in sorted({os.path.abspath(path) for path in source_dirs}):
+        for path in source_files(source_dir):
+            sha256.update(path.encode('utf8') + b'\0')
+            with open(path, 'rb') as file:
+                sha256.update(hashlib.sha256(file.read()).digest())
+    if config_path and os.path.isfile(config_path):
+        with open(config_path, 'rb') as file:
+            sha256.update(b'config\0' + file.read())
+    return sha256.hexdigest()
+
+
+def prune(max_age=MAX_AGE):
+    """
+    Remove the entries of the cache which were not used recently
+    :param max_age: The age of the entries to remove, in seconds
+    """
+    now = time.time()
+    try:
+        entries = os.scandir(cache_dir())
+    except FileNotFoundError:
+        return
+    with entries:
+        for entry in entries:
+            if entry.is_file() and now - entry.stat().st_mtime > max_age:
+                os.remove(entry.path)
+
+
+def cache_entry(source_dirs, config_path=None):
+    """
+    Get the cache file of the jsdoc output of some directories, which sphinx-js reads instead of
+    running jsdoc if it exists, and writes otherwise
+    :param source_dirs: The directories given to jsdoc
+    :param config_path: The path of the jsdoc configuration file, if any
+    :return: A (path, hit) tuple, hit telling whether the entry already exists
+    """
+    prune()
+    path = os.path.join(cache_dir(), f'{cache_key(source_dirs, config_path)}.pickle')
+    os.makedirs(cache_dir(), exist_ok=True)
+    hit = os.path.isfile(path)
+    if hit:
+        # Keep the entry from being pruned
+        os.utime(path)
+    return path, hit
@@ -0,0 +1,56 @@
+"""This module keeps a persistent cache of bare mirrors of the remote repositories"""
+
+
+import os
+import hashlib
+
+from git import Repo
+
+from .constants import CACHE_DIR, REMOTE
+from .util import mag, Step
+
+
+# The repositories already fetched during this run
+FETCHED = set()
+
+
+def mirror_path(repo_path):
+    """
+    Get the path of the bare mirror of a repository
+    :param repo_path: The repository path
+    """
+    return os.path.join(CACHE_DIR, 'mirrors',
+                        f'{hashlib.md5(repo_path.encode("utf8")).hexdigest()}.git')
+
+
+def update_mirror(repo_path):
+    """
+    Create the bare mirror of a repository or fetch its new objects. This is done at most once per
+    run for each repository.
+    :param repo_path: The repository path
+    """
+    path = mirror_path(repo_path)
+    if repo_path in FETCHED:
+        return path
+    if os.path.isdir(path):
+        with Step(f'Fetching {mag(repo_path)} mirror'):
+            Repo(path).git.fetch('--prune', 'origin')
+    else:
+        with Step(f'Mirroring {mag(repo_path)} repository'):
+            Repo.clone_from(REMOTE.format(repo_path), path, mirror=True)
+    FETCHED.add(repo_path)
+    return path
+
+
+def checkout(repo_path, destination):
+    """
+    Check out the tip of a repository from its mirror with a shallow clone. An existing checkout
+    is reused.
+    :param repo_path: The repository path
+    :param destination: The checkout directory
+    """
+    if not os.path.isdir(destination):
+        path = update_mirror(repo_path)
+        with Step(f'Checking out {mag(repo_path)} repository'):
+            Repo.clone_from(f'file://{path}', destination, depth=1)
+    return destination
@@ -0,0 +1,76 @@
+"""
+This module builds all the locales of a project from a single Sphinx process, so that Sphinx and
+the extensions are only loaded once. It is run by builder.run_build with the JSON list of the
+[locale, arguments] builds as its argument.
+"""
+
+
+import os
+import sys
+import json
+import traceback
+from importlib import import_module
+
+from sphinx.application import builtin_extensions
+from sphinx.cmd.build import build_main
+from sphinx.config import Config
+from sphinx.util.tags import Tags
+
+from .builder import LOCALE_MARKER
+
+
+def preload(confdir='.'):
+    # pylint: disable=W0703
+    """
+    Import the builtin extensions and the extensions of the project before any translator is
+    registered. The strings these modules translate when they are imported then stay lazy, and are
+    translated by each build in its own locale.
+    :param confdir: The directory of conf.py
+    """
+    for name in builtin_extensions:
+        import_module(name)
+    try:
+        config = Config.read(confdir, overrides={}, tags=Tags())
+        for name in config.extensions:
+            import_module(name)
+    except Exception:
+        # The build reports the errors of the configuration
+        pass
+
+
+def build(arguments):
+    # pylint: disable=W0212,W0703
+    """
+    Build a locale in a child process, which starts from the preloaded modules and whose
+    translators and other global state do not leak into the next builds
+    :param arguments: The sphinx-build arguments
+    :return: The exit status of the build
+    """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            status = build_main(arguments)
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(status)
+    return os.waitstatus_to_exitcode(os.waitpid(pid, 0)[1])
+
+
+def main():
+    """Build the locales in order, stopping at the first failure"""
+    preload()
+    for locale, arguments in json.loads(sys.argv[1]):
+        status = build(arguments)
+        print(f'{LOCALE_MARKER} {locale} {status}', flush=True)
+        if status:
+            return status
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,18 +2,44 @@
 
 
 import os
-import glob
+import json
+import time
 import hashlib
-from distutils import dir_util, file_util
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
+import sphinx
 import yaml
 from git import GitCommandError, Repo
-from gitlab import Gitlab, GitlabGetError
 from jinja2 import Environment, FileSystemLoader
-from sphinx.cmd import build
 
-from .constants import ENDPOINT, PRIVATE_TOKEN, REMOTE
-from .util import err, header, mag, warn, Section, Step
+from . import artifacts, forge, history, jsdoc, tracing
+from .builder import LOCALE_MARKER, build_arguments, run_build
+from .checkpoint import Checkpoint, checkpoint_path, clear
+from .dedupe import dedupe, discard
+from .expressions import DEFAULT_EXCLUDE, evaluate
+from .index import affected
+from .constants import REMOTE, VERSION
+from .fingerprint import compute_fingerprint, read_manifest, write_manifest
+from .incremental import project_cache, restore_stamps, staged_hashes
+from .mirrors import FETCHED, checkout, update_mirror
+from .publish import acquire_tip, output_stats, publish
+from .scheduler import Scheduler
+from .staging import stage
+from .templates import TemplateRegistry
+from .util import buffered, color_join, err, header, info, mag, warn, Section, Step
+
+
+DEFAULT_OPTIONS = {'jobs': 1, 'parallel_locales': False, 'incremental': False, 'mirrors': False,
+                   'skip_unchanged': False, 'staging': 'copy', 'publish': 'clone', 'gitlab_ttl': 0,
+                   'templates': (), 'trace': None, 'io_jobs': 4, 'build_memory': 0,
+                   'build_timeout': 0, 'walk_exclude': DEFAULT_EXCLUDE, 'shared_locales': False,
+                   'dedupe_assets': False, 'projects': (), 'resume': False,
+                   'artifact_cache': None, 'artifact_cache_size': artifacts.DEFAULT_SIZE,
+                   'history': None, 'changed': ()}
+
+# The processing options changing the output of the locales
+OUTPUT_OPTIONS = ('incremental', 'shared_locales', 'staging', 'templates', 'walk_exclude')
 
 
 def get_field(field, dic, default = "", transform = lambda x: x):
@@ -27,6 +53,14 @@ def get_field(field, dic, default = "", transform = lambda x: x):
     """
     return transform(dic[field]) if field in dic else default
 
+def output_options(options):
+    """
+    Get the processing options changing the output of the locales
+    :param options: The processing options
+    :return: The values of OUTPUT_OPTIONS, by name
+    """
+    return {name: get_field(name, options, DEFAULT_OPTIONS[name]) for name in OUTPUT_OPTIONS}
+
 def auto_list(arg):
     """
     Put the argument in a list if it is not itself a list
@@ -43,35 +77,47 @@ def md5_hash(string):
     """
     return hashlib.md5(string.encode("utf8")).hexdigest()
 
-def get_resources(dic, path):
+def acquire_sources(repo_path, sources_dir, options=None):
+    """
+    Acquire a remote repository holding resources, unless it was already acquired for another
+    section
+    :param repo_path: The repository path
+    :param sources_dir: The directory in which the remote repositories are cloned
+    :param options: The processing options
+    :return: The directory of the repository
+    """
+    temp_path = os.path.join(sources_dir, md5_hash(repo_path))
+    if get_field('mirrors', options or {}, False):
+        checkout(repo_path, temp_path)
+    elif not os.path.isdir(temp_path):
+        with Step(f'Acquiring {mag(repo_path)} repository'):
+            Repo.clone_from(REMOTE.format(repo_path), temp_path)
+    return temp_path
+
+
+def get_resources(dic, path, sources_dir='.', options=None):
     """
     Get resources locally or remotely
     :param dic: The dictionary describing the resources
     :param path: The base destination path
+    :param sources_dir: The directory in which the remote repositories are cloned
+    :param options: The processing options
     """
-    dir_util.mkpath(path)
+    options = options or {}
+    os.makedirs(path, exist_ok=True)
 
     # If the resources are in a remote repository
-    if 'from' in dic:
-        temp_path = md5_hash(dic['from'])
-        with Step(f'Acquiring {mag(format(dic["from"]))} repository'):
-            Repo.clone_from(REMOTE.format(dic['from']), temp_path)
-    else:
-        temp_path = '.'
+    temp_path = acquire_sources(dic['from'], sources_dir, options) if 'from' in dic else '.'
 
     for group in get_field('files', dic, [{}], auto_list):
         destination = get_field('to', group, '.')
         plus = get_field('plus', group, ['*'], auto_list)
         minus = get_field('minus', group, [], auto_list)
-        plus_set = set().union(*[glob.glob(os.path.join(temp_path, rule)) for rule in plus])
-        minus_set = set().union(*[glob.glob(os.path.join(temp_path, rule)) for rule in minus])
-        for match in plus_set.difference(minus_set).difference({'.docs'}):
-            dest = os.path.join(path, destination)
-            with Step(f'Copying {mag(match)} to {mag(dest)}'):
-                if os.path.isfile(match):
-                    file_util.copy_file(match, dest)
-                else:
-                    dir_util.copy_tree(match, os.path.join(dest, os.path.split(match)[-1]))
+        dest = os.path.normpath(os.path.join(path, destination))
+        with Step(f'Staging {color_join(", ", plus, mag)} from {mag(temp_path)} to {mag(dest)}'):
+            count = stage(temp_path, plus, minus, dest, get_field('staging', options, 'copy'))
+            if not count:
+                warn(f'No file matched {color_join(", ", plus, mag)}')
 
 
 def merge_fields(first, other, merge):
@@ -118,23 +164,69 @@ def data_dump(dic, transform = lambda x: x):
     return '\n'.join(f'{i}={transform(j)}' for (i, j) in dic.items())
 
 
-def prepare_templates(section, conf, project_conf, project_dir, templates_template):
+def prepare_templates(section, conf, project_conf, templates):
     """
-    Prepare the templates for a section
+    Prepare the templates for a section. This is done in the order of the sections, which
+    determines the order of the merged configurations.
     :param section: The section name
     :param conf: The section configuration
     :param project_conf: The project configuration
+    :param templates: The template registry
+    """
+    with Step(f'Preparing the templates of section {mag(section)}'):
+        for template in get_field('templates', conf, [], auto_list):
+            merge_confs(project_conf, templates.get(template, section))
+
+
+def freeze_expr_lists(project_conf, docs_dir, exclude=DEFAULT_EXCLUDE):
+    """
+    Evaluate the expression lists once, so that conf.py holds their values instead of evaluating
+    them for every build
+    :param project_conf: The project configuration
+    :param docs_dir: The documentation directory
+    :param exclude: The glob patterns of the directories skipped by the directory walks
+    """
+    with Step('Evaluating the expression lists'):
+        project_conf['expr_values'] = evaluate(project_conf['expr_lists'], project_conf['import'],
+                                               project_conf['vars'], docs_dir, exclude)
+
+
+def use_jsdoc_cache(project_conf, docs_dir):
+    """
+    Point sphinx-js to the cache entry of the jsdoc output of its source directories, so that
+    jsdoc only runs when their sources or its configuration change
+    :param project_conf: The project configuration, whose expression lists are evaluated
+    :param docs_dir: The documentation directory
+    :return: The path of the cache entry if it does not exist yet, None otherwise
+    """
+    if 'sphinx_js' not in project_conf['lists'].get('extensions', set()) or \
+            'jsdoc_cache' in project_conf['vars']:
+        return None
+    source_paths = auto_list(project_conf['expr_values'].get('js_source_path') or
+                             project_conf['lists'].get('js_source_path') or
+                             project_conf['vars'].get('js_source_path', '..'))
+    with Step('Looking up the jsdoc cache'):
+        config_path = project_conf['vars'].get('jsdoc_config_path')
+        path, hit = jsdoc.cache_entry([os.path.join(docs_dir, path) for path in source_paths],
+                                      config_path and os.path.join(docs_dir, config_path))
+        project_conf['vars']['jsdoc_cache'] = path
+    if hit:
+        info('The jsdoc output is cached, jsdoc will not run')
+        return None
+    return path
+
+
+def stage_section(section, conf, project_dir, options=None):
+    """
+    Get the resources of a section
+    :param section: The section name
+    :param conf: The section configuration
     :param project_dir: The project directory
-    :param templates_template: The dynamic template configuration
+    :param options: The processing options
     """
     with Section(f'Section {section}'):
-        with Step('Preparing the templates'):
-            for template in get_field('templates', conf, [], auto_list):
-                rendered = yaml.safe_load(templates_template.render({'source_path': repr(section)}))
-                if template not in rendered:
-                    raise BaseException(f'Template {template} not found')
-                merge_confs(project_conf, rendered[template])
-        get_resources(conf, os.path.join(project_dir, section))
+        get_resources(conf, os.path.join(project_dir, section),
+                      os.path.join(project_dir, '.sources'), options)
 
 
 def build_sphinx_config(data, project_conf, docs_dir, conf_template):
@@ -146,139 +238,682 @@ def build_sphinx_config(data, project_conf, docs_dir, conf_template):
     :param conf_template: The configuration file template
     """
     with Step('Building Sphinx configuration'):
-        data['imports'] = (f'import {", ".join(project_conf["import"])}'
+        data['imports'] = (f'import {", ".join(sorted(project_conf["import"]))}'
                            if project_conf['import'] else '')
         data['vars'] = data_dump(project_conf['vars'], repr)
-        data['expr_lists'] = data_dump(project_conf['expr_lists'], lambda x: f'list({x})')
-        data['lists'] = data_dump(project_conf['lists'], lambda x: repr(list(x)))
-
-        with open(os.path.join(docs_dir, 'conf.py'), 'w', encoding='utf8') as file:
+        # The expression lists are frozen, see freeze_expr_lists
+        data['expr_lists'] = data_dump(project_conf['expr_values'], repr)
+        # Sort the lists so that the configuration, hence the Sphinx environment, is stable
+        data['lists'] = data_dump(project_conf['lists'], lambda x: repr(sorted(x)))
+
+        # A staged conf.py may be a link to a source file, which must not be overwritten
+        conf_path = os.path.join(docs_dir, 'conf.py')
+        if os.path.lexists(conf_path):
+            os.remove(conf_path)
+        with open(conf_path, 'w', encoding='utf8') as file:
             file.write(conf_template.render(data))
 
 
-def touch_project(project_name, repo_path, gitlab):
+def acquire_build_repository(project, repo_path, gitlab, build_dir, plumbing=False):
+    # pylint: disable=R0913
     """
-    Touches a project
-    :param project_name: The project name
-    :param repo_path: The project path
+    Acquire the output repository
+    :param project: The project name
+    :param repo_path: The repository path
     :param gitlab: The Gitlab object
+    :build_dir: The output directory
+    :param plumbing: Whether to only fetch the tip in a bare repository next to the output
+                     directory instead of cloning the whole repository in it
     """
-    try:
-        gitlab.projects.get(repo_path)
-    except GitlabGetError:
-        create_project(project_name, repo_path.split('/'), gitlab)
+    with Step(f'Acquiring {mag("target")} repository'):
+        forge.touch_project(project, repo_path, gitlab)
+        if plumbing:
+            os.makedirs(build_dir)
+            return acquire_tip(REMOTE.format(repo_path), f'{build_dir}.git')
+        build_repo = Repo.clone_from(REMOTE.format(repo_path), build_dir)
+        try:
+            build_repo.git.rm('-rf', '*')
+        except GitCommandError as e:
+            warn(f'Exception GitCommandError raised: {e}')
+        return build_repo
 
 
-def get_group(group_path_parts, gitlab):
+def build_locale(docs_dir, locale, main=False, cache_dir=None, limits=None):
+    # pylint: disable=R0913
     """
-    Get a group ID from a path. If the group or its parents don't exist, create them.
-    :param group_path_parts: The path parts
-    :param gitlab: The Gitlab object
+    Build a locale in a subprocess
+    :param docs_dir: The documentation directory
+    :param locale: The locale
+    :param main: Whether the locale is the main one
+    :param cache_dir: The project cache directory keeping the doctrees, if any
+    :param limits: The 'jobs' of Sphinx, and the 'memory' (in MB) and 'timeout' (in seconds) of
+                   the build
+    :return: A (status, output, reason, peak_rss) tuple, see builder.run_build
     """
-    try:
-        return gitlab.groups.get('/'.join(group_path_parts))
-    except GitlabGetError:
-        group = get_group(group_path_parts[:-1], gitlab)
-        name = group_path_parts[-1]
-        return gitlab.groups.create({'name': name, 'path': name, 'parent_id': group.id})
+    limits = limits or {}
+    return run_build(docs_dir, build_arguments(locale, main, cache_dir,
+                                               get_field('jobs', limits, 1)),
+                     get_field('memory', limits, 0), get_field('timeout', limits, 0))
 
 
-def create_project(project_name, project_path_parts, gitlab):
+def report_build(status, output, reason=None, peak_rss=0):
     """
-    Create a GitLab project
-    :param project_name: The project name
-    :param project_path_parts: The path parts
-    :param gitlab: The Gitlab object
+    Print the output of a build, record its memory and raise an exception if it failed
+    :param status: The exit code of Sphinx
+    :param output: The output of Sphinx
+    :param reason: The reason why the build was killed, if it was
+    :param peak_rss: The peak resident set size of the build, in kB
     """
-    group = get_group(project_path_parts[:-1], gitlab)
-    gitlab.projects.create({'name': project_name, 'path': project_path_parts[-1],
-                            'namespace_id': group.id})
+    print(output, end='')
+    tracing.record_rss(peak_rss)
+    if reason:
+        raise BaseException(f'The build {reason}')
+    if status:
+        raise BaseException(f'An error occurred (Sphinx exited with status {mag(str(status))})')
 
 
-def acquire_build_repository(project, repo_path, gitlab, build_dir):
+def build_locales(docs_dir, locales, cache_dir=None, limits=None, checkpoint=None):
+    # pylint: disable=R0913
     """
-    Acquire the output repository
-    :param project: The project name
-    :param repo_path: The repository path
-    :param gitlab: The Gitlab object
-    :build_dir: The output directory
+    Build secondary locales concurrently
+    :param docs_dir: The documentation directory
+    :param locales: The locales to build
+    :param cache_dir: The project cache directory keeping the doctrees, if any
+    :param limits: The limits of the builds, see build_locale
+    :param checkpoint: The checkpoint recording the locales built successfully, if any
     """
-    with Step(f'Acquiring {mag("target")} repository'):
-        touch_project(project, repo_path, gitlab)
-        build_repo = Repo.clone_from(REMOTE.format(repo_path), build_dir)
+    with Step(f'Generating documentation for the {color_join(", ", locales, mag)} locales',
+              single_line=False):
+        results = {}
+        with ThreadPoolExecutor(max_workers=min(len(locales), os.cpu_count() or 1)) as executor:
+            futures = {executor.submit(build_locale, docs_dir, locale, False, cache_dir, limits):
+                       locale for locale in locales}
+            for future in as_completed(futures):
+                status, output, reason, peak_rss = future.result()
+                print(output, end='')
+                tracing.record_rss(peak_rss)
+                results[futures[future]] = (status, reason)
+        for locale in locales:
+            status, reason = results[locale]
+            (warn if status else info)(f'Locale {mag(locale)} exited with status '
+                                       f'{mag(str(status))}' + (f': the build {reason}'
+                                                                if reason else ''))
+            if checkpoint and not status:
+                checkpoint.record(f'locale {locale}', [locale_dir(docs_dir, locale)],
+                                  ['target', 'config'])
+        failed = [locale for locale in locales if results[locale][0]]
+        if failed:
+            raise BaseException(f'An error occurred for the {color_join(", ", failed, mag)} '
+                                f'{"locale" if len(failed) == 1 else "locales"}')
+
+
+def build_shared_locales(docs_dir, locales, cache_dir=None, limits=None):
+    """
+    Build all the locales in order from a single Sphinx process, see multilocale
+    :param docs_dir: The documentation directory
+    :param locales: The locales, the first one being the main one
+    :param cache_dir: The project cache directory keeping the doctrees, if any
+    :param limits: The limits of the build, see build_locale
+    """
+    with Step(f'Generating documentation for the {color_join(", ", locales, mag)} locales',
+              single_line=False):
+        limits = limits or {}
+        builds = [[locale, build_arguments(locale, i == 0, cache_dir, get_field('jobs', limits, 1))]
+                  for i, locale in enumerate(locales)]
+        status, output, reason, peak_rss = run_build(
+            docs_dir, [json.dumps(builds)], get_field('memory', limits, 0),
+            get_field('timeout', limits, 0), 'vzr.multilocale')
+        tracing.record_rss(peak_rss)
+        statuses = {}
+        for line in output.splitlines(keepends=True):
+            if line.startswith(LOCALE_MARKER):
+                _, locale, code = line.split()
+                statuses[locale] = int(code)
+            else:
+                print(line, end='')
+        for locale, code in statuses.items():
+            (warn if code else info)(f'Locale {mag(locale)} exited with status {mag(str(code))}')
+        if reason:
+            raise BaseException(f'The build {reason}')
+        if status:
+            raise BaseException('An error occurred')
+
+
+def locale_dir(docs_dir, locale):
+    """
+    Get the output directory of a locale
+    :param docs_dir: The documentation directory
+    :param locale: The locale
+    """
+    return os.path.join(os.path.dirname(docs_dir), '.build', locale)
+
+
+def generate_documentation(docs_dir, locales, checkpoint, cache_dir=None, options=None,
+                           limits=None):
+    # pylint: disable=R0913,R0917
+    """
+    Generate the documentation for the locales which are not built yet, each build being run in
+    its own subprocess unless the locales are built in a shared one
+    :param docs_dir: The documentation directory
+    :param locales: The locales, the first one being the main one
+    :param checkpoint: The checkpoint of the project, recording each locale once built
+    :param cache_dir: The project cache directory keeping the doctrees, if any
+    :param options: The processing options
+    :param limits: The limits of the builds, see build_locale
+    :return: The names of the stages of the checkpoint building the locales
+    """
+    after = ['target', 'config']
+    if get_field('shared_locales', options or {}, False) and len(locales) > 1:
+        if not checkpoint.complete('locales'):
+            # A killed build may have left stale or partial pages
+            clear([locale_dir(docs_dir, locale) for locale in locales])
+            build_shared_locales(docs_dir, locales, cache_dir, limits)
+            checkpoint.record('locales', [locale_dir(docs_dir, locale) for locale in locales],
+                              after)
+        return ['locales']
+
+    if not checkpoint.complete(f'locale {locales[0]}'):
+        clear([locale_dir(docs_dir, locales[0])])
+        with Step(f'Generating documentation for the main locale ({mag(locales[0])})',
+                  single_line=False):
+            report_build(*build_locale(docs_dir, locales[0], True, cache_dir, limits))
+        checkpoint.record(f'locale {locales[0]}', [locale_dir(docs_dir, locales[0])], after)
+
+    pending = [locale for locale in locales[1:] if not checkpoint.complete(f'locale {locale}')]
+    clear([locale_dir(docs_dir, locale) for locale in pending])
+    if get_field('parallel_locales', options or {}, False) and len(pending) > 1:
+        build_locales(docs_dir, pending, cache_dir, limits, checkpoint)
+    else:
+        for locale in pending:
+            with Step(f'Generating documentation for the {mag(locale)} locale', single_line=False):
+                report_build(*build_locale(docs_dir, locale, False, cache_dir, limits))
+            checkpoint.record(f'locale {locale}', [locale_dir(docs_dir, locale)], after)
+    return [f'locale {locale}' for locale in locales]
+
+
+def push_build_repository(build_repo, build_dir, plumbing=False):
+    """
+    Commit the generated documentation and push it
+    :param build_repo: The target repository
+    :param build_dir: The output directory
+    :param plumbing: Whether the target repository is a bare repository to write the output
+                     directory in with git plumbing
+    """
+    with Step('Pushing the target repository', 'Done', single_line=False):
+        if plumbing:
+            if not publish(build_repo, build_dir, 'Automatic Vizir modification'):
+                warn('Nothing to commit, the target repository is up to date')
+            return
+        build_repo.git.add(':!**/.doctrees/*')
         try:
-            build_repo.git.rm('-rf', '*')
+            build_repo.git.commit("-m", "Automatic Vizir modification")
         except GitCommandError as e:
             warn(f'Exception GitCommandError raised: {e}')
-        return build_repo
+        else:
+            build_repo.git.push()
 
 
-def process_project(project, directory, conf, templates_template, conf_template):
+def project_inputs(project, conf, project_dir, options):
     """
-    Process a Vizir project
+    List the inputs of a project which are not staged files
+    :param project: The project name
+    :param conf: The project configuration
+    :param project_dir: The project directory
+    :param options: The processing options
+    """
+    sources = {repo: Repo(os.path.join(project_dir, '.sources', md5_hash(repo))).head.commit.hexsha
+               for repo in remote_repositories({project: conf})}
+    return {'sources': sources, 'locales': get_field('locales', conf, ['fr'], auto_list),
+            'vizir': VERSION, 'sphinx': sphinx.__version__,
+            'options': {**output_options(options),
+                        'dedupe_assets': get_field('dedupe_assets', options, False)}}
+
+
+def prepare_project(project, conf, project_conf, templates):
+    """
+    Prepare the templates of the code sections of a project
+    :param project: The project name
+    :param conf: The project configuration
+    :param project_conf: The configuration of the Sphinx project, updated by the templates
+    :param templates: The template registry
+    :return: The values of the Sphinx configuration, as Python expressions by name
+    """
+    version = get_field('version', conf, transform=str)
+    data = {'project': project, 'version': version, 'copyright': get_field('copyright', conf),
+            'release': get_field('release', conf, version, str)}
+    code = get_field('code', conf, {})
+    for sec in code:
+        prepare_templates(sec, code[sec], project_conf, templates)
+    return {key: repr(val) for (key, val) in data.items()}
+
+
+def write_config(data, project_conf, docs_dir, conf_template, options):
+    # pylint: disable=R0913
+    """
+    Write the Sphinx configuration of a project, once its sections are staged
+    :param data: The values of the Sphinx configuration, see prepare_project
+    :param project_conf: The configuration of the Sphinx project
+    :param docs_dir: The staging directory
+    :param conf_template: The configuration template
+    :param options: The processing options
+    :return: The jsdoc cache entry used by the project, if any
+    """
+    freeze_expr_lists(project_conf, docs_dir, get_field('walk_exclude', options, DEFAULT_EXCLUDE))
+    jsdoc_entry = use_jsdoc_cache(project_conf, docs_dir)
+    build_sphinx_config(data, project_conf, docs_dir, conf_template)
+    return jsdoc_entry
+
+
+def build_project(docs_dir, locales, checkpoint, cache_dir, conf, options, jsdoc_entry=None):
+    # pylint: disable=R0913,R0917
+    """
+    Build the locales of a project within the limits set by its configuration
+    :param docs_dir: The staging directory
+    :param locales: The locales, the first one being the main one
+    :param checkpoint: The checkpoint of the project
+    :param cache_dir: The directory of the incremental build cache, None to build from scratch
+    :param conf: The project configuration
+    :param options: The processing options
+    :param jsdoc_entry: The jsdoc cache entry used by the project, if any
+    :return: The names of the stages of the checkpoint building the locales
+    """
+    limits = {'jobs': get_field('jobs', conf, 1),
+              'memory': get_field('build_memory', options, 0),
+              'timeout': get_field('build_timeout', options, 0)}
+    try:
+        return generate_documentation(docs_dir, locales, checkpoint, cache_dir, options, limits)
+    except BaseException:
+        # A killed build may have left a truncated jsdoc output in the cache
+        if jsdoc_entry and os.path.exists(jsdoc_entry):
+            os.remove(jsdoc_entry)
+        raise
+
+
+def fingerprint_project(project, conf, project_dir, options):
+    """
+    Fingerprint the inputs of a project
+    :param project: The project name
+    :param conf: The project configuration
+    :param project_dir: The project directory
+    :param options: The processing options
+    :return: A (hashes, fingerprint, inputs) tuple, see compute_fingerprint
+    """
+    with Step('Computing the input fingerprint'):
+        hashes = staged_hashes(project_dir)
+        inputs = project_inputs(project, conf, project_dir, options)
+        return hashes, compute_fingerprint(hashes, inputs), inputs
+
+
+def lookup_artifacts(project_dir, locales, checkpoint, options, hashes=None):
+    """
+    Open the artifact cache and restore the output of the locales it holds
+    :param project_dir: The project directory
+    :param locales: The locales, the first one being the main one
+    :param checkpoint: The checkpoint of the project
+    :param options: The processing options
+    :param hashes: The hashes of the staged files, if already computed
+    :return: A (cache, keys, missing) tuple, the keys of the output of the locales being given by
+             locale, and missing being the locales to build
+    """
+    cache = artifacts.open_cache(options['artifact_cache'],
+                                 get_field('artifact_cache_size', options, artifacts.DEFAULT_SIZE))
+    with Step('Computing the artifact keys'):
+        hashes = hashes or staged_hashes(project_dir)
+        keys = {locale: artifacts.artifact_key(hashes, locale, i == 0, output_options(options))
+                for i, locale in enumerate(locales)}
+    missing = artifacts.restore_locales(cache, keys, os.path.join(project_dir, '.build'),
+                                        checkpoint, get_field('shared_locales', options, False)
+                                        and len(locales) > 1)
+    return cache, keys, missing
+
+
+def share_assets(build_dir, locales, checkpoint, built):
+    """
+    Move the assets identical in every locale to the shared directory, unless already done
+    :param build_dir: The output directory
+    :param locales: The locales
+    :param checkpoint: The checkpoint of the project
+    :param built: The names of the stages of the checkpoint building the locales
+    :return: The names of the stages of the checkpoint writing the output
+    """
+    if not checkpoint.complete('assets'):
+        with Step('Sharing the assets identical in every locale'):
+            count, saved = dedupe(build_dir, locales)
+        info(f'{mag(str(count))} assets shared, {mag(f"{saved / 1024:.0f} kB")} saved')
+        checkpoint.record('assets', after=built)
+    return built + ['assets']
+
+
+def acquire_target(project, conf, gitlab, build_dir, checkpoint, plumbing=False):
+    # pylint: disable=R0913,R0917
+    """
+    Acquire the output repository, or open the one acquired by the resumed run
+    :param project: The project name
+    :param conf: The project configuration
+    :param gitlab: The Gitlab object
+    :param build_dir: The output directory
+    :param checkpoint: The checkpoint of the project
+    :param plumbing: Whether the target repository is a bare repository next to the output
+                     directory
+    """
+    outputs = [build_dir, f'{build_dir}.git'] if plumbing else [build_dir]
+    if checkpoint.complete('target'):
+        return Repo(outputs[-1])
+    return checkpoint.execute('target', outputs, (), acquire_build_repository, project,
+                              get_field('repo', conf), gitlab, build_dir, plumbing)
+
+
+def staging_stages(conf, project_dir, options):
+    """
+    List the stages of the checkpoint staging the sections of a project
+    :param conf: The project configuration
+    :param project_dir: The project directory
+    :param options: The processing options
+    :return: The (section configuration, output directory, function, arguments) tuples, by stage
+    """
+    sources_dir = os.path.join(project_dir, '.sources')
+    docs = get_field('docs', conf, {'files': {'plus': '*', 'to': '.'}})
+    code = get_field('code', conf, {})
+    stages = {'docs': (docs, os.path.join(project_dir, '.docs'), get_resources,
+                       (docs, os.path.join(project_dir, '.docs'), sources_dir, options))}
+    stages.update({f'section {sec}': (code[sec], os.path.join(project_dir, sec), stage_section,
+                                      (sec, code[sec], project_dir, options))
+                   for sec in code})
+    return stages
+
+
+def schedule_staging(scheduler, conf, project_dir, checkpoint, options):
+    # pylint: disable=R0913
+    """
+    Schedule the acquisition of the remote repositories and the staging of the sections which are
+    not staged yet, each section being staged as soon as its repository is acquired
+    :param scheduler: The scheduler
+    :param conf: The project configuration
+    :param project_dir: The project directory
+    :param checkpoint: The checkpoint of the project
+    :param options: The processing options
+    :return: The names of the stages of the checkpoint staging the sections
+    """
+    sections = staging_stages(conf, project_dir, options)
+    pending = [name for name in sections if not checkpoint.complete(name)]
+
+    sources_dir = os.path.join(project_dir, '.sources')
+    sources = {}
+    for repo in sorted({sections[name][0]['from'] for name in pending
+                        if 'from' in sections[name][0]}):
+        if not checkpoint.complete(f'sources {repo}'):
+            sources[repo] = scheduler.add(f'sources {repo}', checkpoint.execute,
+                                          f'sources {repo}',
+                                          [os.path.join(sources_dir, md5_hash(repo))], (),
+                                          acquire_sources, repo, sources_dir, options)
+    for name in pending:
+        section, path, func, args = sections[name]
+        scheduler.add(name, checkpoint.execute, name, [path],
+                      [f'sources {section["from"]}'] if 'from' in section else [], func, *args,
+                      after=[sources[section['from']]] if section.get('from') in sources else [])
+    return list(sections)
+
+
+def process_project(project, directory, conf, templates, conf_template, options=None):
+    # pylint: disable=R0913,R0914,R0917
+    """
+    Process a Vizir project, skipping the stages completed by a previous run when resuming it
     :param project: The project name
     :param directory: The base directory
     :param conf: The project configuration
-    :param templates_template: The dynamic template configuration
+    :param templates: The template registry
     :param conf_template: The configuration template
+    :param options: The processing options
     """
-    project_conf = {'import': set(), 'vars': {}, 'lists': {}, 'expr_lists': {}}
+    options = options or {}
+    project_conf = {'import': set(), 'vars': {}, 'lists': {}, 'expr_lists': {}, 'expr_values': {}}
     project_dir = os.path.join(directory, '.docs', project)
     docs_dir = os.path.join(project_dir, '.docs')
     build_dir = os.path.join(project_dir, '.build')
-    os.makedirs(docs_dir)
+    os.makedirs(project_dir, exist_ok=True)
+    checkpoint = Checkpoint(project_dir, conf, get_field('resume', options, False))
+    checkpoint.forget([f'sources {repo}' for repo in get_field('changed', options, ())])
 
-    gitlab = Gitlab(f'https://{ENDPOINT}', private_token=PRIVATE_TOKEN)
-    gitlab.auth()
+    gitlab = forge.client()
 
     with Section(f'Project {project}'):
-        build_repo = acquire_build_repository(project, get_field('repo', conf), gitlab, build_dir)
+        if checkpoint.complete('push'):
+            info(f'{mag(project)} was already processed by the resumed run')
+            return
+        if checkpoint.stages:
+            info(f'Resuming {mag(project)} from {mag(str(len(checkpoint.stages)))} '
+                 f'completed stages')
+
+        plumbing = get_field('publish', options, 'clone') == 'plumbing'
+        data = prepare_project(project, conf, project_conf, templates)
+
+        # The target and the remote repositories are acquired concurrently, and each section is
+        # staged as soon as its repository is acquired
+        scheduler = Scheduler(get_field('io_jobs', options, 1))
+        target = scheduler.add('target', acquire_target, project, conf, gitlab, build_dir,
+                               checkpoint, plumbing)
+        staging = schedule_staging(scheduler, conf, project_dir, checkpoint, options)
+        build_repo = scheduler.run()[target]
+
+        jsdoc_entry = None
+        if not checkpoint.complete('config'):
+            jsdoc_entry = checkpoint.execute('config', [os.path.join(docs_dir, 'conf.py')], staging,
+                                             write_config, data, project_conf, docs_dir,
+                                             conf_template, options)
 
-        version = get_field('version', conf, transform=str)
-        data = {'project': project, 'version': version, 'copyright': get_field('copyright', conf),
-                'release': get_field('release', conf, version, str)}
-        data = {key: repr(val) for (key, val) in data.items()}
+        locales = get_field('locales', conf, ['fr'], auto_list)
 
-        get_resources(get_field('docs', conf, {'files': {'plus': '*', 'to': '.'}}), docs_dir)
+        hashes, fingerprint, inputs = None, None, None
+        if get_field('skip_unchanged', options, False):
+            hashes, fingerprint, inputs = fingerprint_project(project, conf, project_dir,
+                                                              options)
+            if read_manifest(build_repo).get('fingerprint') == fingerprint:
+                info(f'Inputs unchanged since the last build, skipping {mag(project)}')
+                return
 
-        for sec in get_field('code', conf, []):
-            prepare_templates(sec, conf['code'][sec], project_conf, project_dir, templates_template)
+        cache_dir = None
+        if get_field('incremental', options, False):
+            cache_dir = project_cache(get_field('repo', conf))
+            with Step('Restoring the modification times of unchanged sources'):
+                restore_stamps(project_dir, cache_dir, hashes)
 
-        build_sphinx_config(data, project_conf, docs_dir, conf_template)
+        if get_field('dedupe_assets', options, False):
+            discard(build_dir, locales, checkpoint)
 
-        cwd = os.getcwd()
-        os.chdir(docs_dir)
+        cache, keys, missing = None, None, []
+        if get_field('artifact_cache', options, None):
+            cache, keys, missing = lookup_artifacts(project_dir, locales, checkpoint, options,
+                                                    hashes)
 
-        locales = get_field('locales', conf, ['fr'], auto_list)
-        with Step(f'Generating documentation for the main locale ({mag(locales[0])})',
-                  single_line=False):
-            if build.main(['.', os.path.join('..', '.build', locales[0])]):
-                raise BaseException('An error occurred')
+        built = build_project(docs_dir, locales, checkpoint, cache_dir, conf, options,
+                              jsdoc_entry)
+        if missing:
+            artifacts.store_locales(cache, keys, build_dir, missing)
+
+        if get_field('dedupe_assets', options, False) and len(locales) > 1:
+            built = share_assets(build_dir, locales, checkpoint, built)
+
+        if fingerprint:
+            write_manifest(build_dir, fingerprint, inputs)
+        push_build_repository(build_repo, build_dir, plumbing)
+        checkpoint.record('push', after=['target'] + built)
 
-        for locale in locales[1:]:
-            with Step(f'Generating documentation for the {mag(locale)} locale', single_line=False):
-                if build.main(['.', os.path.join('..', '.build', locale),
-                              '-D', f'language={locale}']):
-                    raise BaseException('An error occurred')
-
-        with Step('Pushing the target repository', 'Done', single_line=False):
-            build_repo.git.add(':!**/.doctrees/*')
-            try:
-                build_repo.git.commit("-m", "Automatic Vizir modification")
-            except GitCommandError as e:
-                warn(f'Exception GitCommandError raised: {e}')
-            else:
-                build_repo.git.push()
 
-        os.chdir(cwd)
+def remote_repositories(conf):
+    """
+    List the remote repositories used by the projects of a Vizir file
+    :param conf: The Vizir configuration
+    """
+    repositories = set()
+    for project in conf.values():
+        sections = [get_field('docs', project, {})] + list(get_field('code', project, {}).values())
+        repositories |= {section['from'] for section in sections if 'from' in section}
+    return sorted(repositories)
 
 
-def process(directory="."):
+def load_templates(search_path=()):
+    """
+    Load the template registry and the configuration template
+    :param search_path: Additional template files or directories of template files
+    """
+    env = Environment(loader=FileSystemLoader(os.path.dirname(os.path.realpath(__file__))))
+    return TemplateRegistry(search_path), env.get_template('conf.py.j2')
+
+
+def init_worker(fetched, gitlab_cache):
+    """
+    Initialize a worker process with the state of the run
+    :param fetched: The repositories already fetched during the run
+    :param gitlab_cache: The GitLab cache
+    """
+    FETCHED.update(fetched)
+    forge.reset(gitlab_cache)
+
+
+def run_project(project, directory, conf, options):
+    # pylint: disable=W0703
+    """
+    Process a Vizir project in a worker, buffering its output
+    :param project: The project name
+    :param directory: The base directory
+    :param conf: The project configuration
+    :param options: The processing options
+    :return: A (project, output, status, events, stats, cache) tuple, the status being 0 on
+             success, the events being the spans recorded by the worker, the stats being its
+             artifact cache statistics and the cache being its GitLab cache
+    """
+    status = 0
+    tracing.reset()
+    artifacts.reset()
+    with buffered() as buffer:
+        try:
+            process_project(project, directory, conf, *load_templates(options['templates']),
+                            options)
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+        except Exception:
+            traceback.print_exc()
+            status = 1
+    return (project, buffer.getvalue(), status, list(tracing.EVENTS), dict(artifacts.STATS),
+            forge.CACHE)
+
+
+def process_projects(directory, conf, options):
+    """
+    Process all the projects of a Vizir file in a process pool
+    :param directory: The base directory
+    :param conf: The Vizir configuration
+    :param options: The processing options
+    """
+    jobs = min(options['jobs'], os.cpu_count() or 1, len(conf))
+    info(f'Processing {mag(str(len(conf)))} projects with {mag(str(jobs))} workers')
+    failed = []
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                             initargs=(set(FETCHED), forge.CACHE)) as executor:
+        futures = [executor.submit(run_project, project, directory, conf[project], options)
+                   for project in conf]
+        for future in as_completed(futures):
+            project, output, status, events, stats, cache = future.result()
+            tracing.merge(events)
+            artifacts.merge(stats)
+            forge.merge(cache)
+            print(output, end='')
+            if status:
+                failed.append(project)
+    if failed:
+        err(f'Failed to process {", ".join(mag(project) for project in failed)}')
+
+
+def record_run(directory, conf, options, started, status):
+    # pylint: disable=R0913
+    """
+    Write the trace of the run and record it in the history database, if enabled
+    :param directory: The base directory
+    :param conf: The Vizir configuration
+    :param options: The processing options
+    :param started: The start time of the run
+    :param status: The exit status of the run
+    """
+    if options['trace']:
+        tracing.write_trace(options['trace'])
+    if options['history'] is not None:
+        run = {'started': started, 'directory': directory, 'status': status,
+               'duration': time.time() - started, 'options': options}
+        history.record(options['history'], run, tracing.EVENTS, output_stats(directory, conf),
+                       artifacts.STATS if options['artifact_cache'] else {})
+
+
+def print_summary(options, count=10):
+    """
+    Print the slowest steps of the run and the statistics of the artifact cache
+    :param options: The processing options
+    :param count: The number of steps to print
+    """
+    events = tracing.slowest(count)
+    if events:
+        with Section(history.SUMMARY_SECTION):
+            for event in events:
+                args = event['args']
+                info(f'{event["dur"] / 1e6:8.2f} s {args["cpu"]:8.2f} s CPU '
+                     f'{args["peak_rss"] / 1024:7.1f} MB  '
+                     f'{mag(" > ".join(args["path"] + [event["name"]]))}')
+    if options['artifact_cache']:
+        stats = artifacts.STATS
+        restored = f'{stats["restored_bytes"] / 1024:.0f} kB'
+        info(f'Artifact cache: {mag(str(stats["hits"]))} hits, '
+             f'{mag(str(stats["misses"]))} misses, {mag(str(stats["stored"]))} stored, '
+             f'{mag(str(stats["evicted"]))} evicted, {mag(restored)} restored')
+
+
+def process(directory=".", **options):
     """
     Process a Vizir directory and build the documentation
     :param directory: The directory to process
+    :param options: The processing options, overriding DEFAULT_OPTIONS:
+                    - jobs: The maximum number of projects processed concurrently
+                    - parallel_locales: Whether to build the secondary locales concurrently
+                    - incremental: Whether to keep the Sphinx environment between runs
+                    - mirrors: Whether to fetch the remote repositories into local mirrors
+                    - skip_unchanged: Whether to skip the projects whose inputs did not change
+                    - staging: How the resources are staged, amongst staging.MODES
+                    - publish: How the target repository is updated, either 'clone' to commit
+                      from a full clone or 'plumbing' to write the output tree on top of the
+                      fetched tip without a working tree
+                    - gitlab_ttl: The time during which the existing GitLab groups and projects
+                      are cached on disk, in seconds (0 to disable it)
+                    - templates: Additional template files or directories of template files
+                    - trace: The path of a Chrome trace file to write the recorded sections and
+                      steps to, if any
+                    - io_jobs: The maximum number of repositories acquired and sections staged
+                      concurrently in each project
+                    - build_memory: The maximum resident set size of each Sphinx build, in MB (0
+                      for no limit)
+                    - build_timeout: The maximum duration of each Sphinx build, in seconds (0 for
+                      no limit)
+                    - walk_exclude: The glob patterns of the directories skipped when the
+                      expression lists of the templates walk the sources
+                    - shared_locales: Whether to build all the locales of a project from a single
+                      Sphinx process, importing Sphinx and the extensions once
+                    - dedupe_assets: Whether to move the static files and images identical in
+                      every locale into a shared directory of the target repository
+                    - projects: The names of the projects to process, all of them if empty
+                    - history: The path of the history database to record the durations of the
+                      steps and the output of the projects in, see history, if any
+                    - resume: Whether to resume a failed run from the stages it completed,
+                      recorded in the checkpoint manifest of each project, instead of refusing
+                      to run while the .docs directory exists
+                    - artifact_cache: The location of the artifact cache keeping the output of
+                      the locales, see artifacts.open_cache, if any
+                    - artifact_cache_size: The maximum size of the artifact cache, in MB (0 for
+                      no limit)
+                    - changed: The source repositories which changed, fetched again even if
+                      the resumed run already fetched them
     """
+    tracing.reset()
+    artifacts.reset()
+    started = time.time()
     header('Vizir Processor')
+    directory = os.path.abspath(directory)
 
     try:
         with open(os.path.join(directory, '.docs.yml'), 'r', encoding='utf8') as file:
@@ -286,11 +921,72 @@ def process(directory="."):
     except FileNotFoundError:
         err(f'No {mag(".docs.yml")} file found')
 
-    if os.path.exists(os.path.join(directory, '.docs')):
+    options = {**DEFAULT_OPTIONS, **options}
+    if os.path.exists(os.path.join(directory, '.docs')) and not options['resume']:
         err(f'{mag(".docs")} directory already exists')
 
-    env = Environment(loader=FileSystemLoader(os.path.dirname(os.path.realpath(__file__))))
-    conf_template = env.get_template('conf.py.j2')
-    templates_template = env.get_template('templates.yml')
-    for project in conf:
-        process_project(project, directory, conf[project], templates_template, conf_template)
+    if options['projects']:
+        conf = {project: conf[project] for project in conf if project in options['projects']}
+    status = 1
+    try:
+        if options['mirrors']:
+            with Section('Mirrors'):
+                for repo_path in remote_repositories(conf):
+                    update_mirror(repo_path)
+
+        forge.load_cache(options['gitlab_ttl'])
+        with Section('GitLab'):
+            with Step('Looking up the target projects'):
+                missing = forge.prefetch([get_field('repo', conf[project]) for project in conf],
+                                         forge.client())
+            if missing:
+                info(f'Projects to create: {color_join(", ", missing, mag)}')
+
+        if options['jobs'] > 1 and len(conf) > 1:
+            process_projects(directory, conf, options)
+        else:
+            templates, conf_template = load_templates(options['templates'])
+            for project in conf:
+                process_project(project, directory, conf[project], templates, conf_template,
+                                options)
+        forge.save_cache()
+        print_summary(options)
+        status = 0
+    finally:
+        # The trace and the history are also useful to find where a failed run spent its time
+        record_run(directory, conf, options, started, status)
+
+
+def process_changed(repos, index_path=None, **options):
+    """
+    Process the projects using some source repositories, according to the index. Unless resuming,
+    the previous state of these projects is removed first, so that each run starts from scratch.
+    :param repos: The source repositories which changed
+    :param index_path: The index path, index.INDEX_FILE by default
+    :param options: The processing options, see process
+    """
+    directories = affected(repos, index_path)
+    if not directories:
+        header('Vizir Processor')
+        info(f'No indexed project uses {color_join(", ", repos, mag)}')
+        return
+    cwd = os.getcwd()
+    failed = []
+    for directory, projects in directories.items():
+        try:
+            # The local resources are looked up in the current directory
+            os.chdir(directory)
+            if not options.get('resume'):
+                for project in projects:
+                    project_dir = os.path.join(directory, '.docs', project)
+                    clear([project_dir, checkpoint_path(project_dir)])
+            # The other projects of the directory are left alone, whatever their state
+            process(directory, **{**options, 'projects': projects, 'resume': True,
+                                  'changed': repos})
+        except SystemExit as e:
+            if e.code:
+                failed.append(directory)
+        finally:
+            os.chdir(cwd)
+    if failed:
+        err(f'Failed to process {color_join(", ", failed, mag)}')
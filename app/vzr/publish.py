@@ -0,0 +1,175 @@
+"""This module publishes the generated documentation with git plumbing, without a working tree"""
+
+
+import os
+import stat
+import hashlib
+import subprocess
+
+from git import GitCommandError, Repo
+
+
+DEFAULT_BRANCH = 'master'
+IGNORED_DIRS = {'.doctrees', '.git'}
+
+
+def git_input(repo, args, stdin, env=None):
+    """
+    Run a git command on a repository, feeding it the given standard input
+    :param repo: The repository
+    :param args: The git arguments
+    :param stdin: The standard input, as bytes
+    :param env: The additional environment variables
+    :return: The stripped standard output
+    """
+    result = subprocess.run(['git', '--git-dir', repo.git_dir, *args], input=stdin,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False,
+                            env={**os.environ, **(env or {})})
+    if result.returncode:
+        raise GitCommandError(['git', *args], result.returncode, result.stderr)
+    return result.stdout.decode('utf8').strip()
+
+
+def acquire_tip(url, git_dir):
+    """
+    Fetch only the tip of the default branch of a repository in a bare repository, without its
+    blobs
+    :param url: The repository URL
+    :param git_dir: The bare repository directory
+    :return: The bare repository, whose HEAD points to the default branch
+    """
+    repo = Repo.init(git_dir, bare=True)
+    repo.git.remote('add', 'origin', url)
+    branch = DEFAULT_BRANCH
+    for line in repo.git.ls_remote('--symref', 'origin', 'HEAD').splitlines():
+        if line.startswith('ref: refs/heads/'):
+            branch = line.split()[1][len('refs/heads/'):]
+    repo.git.symbolic_ref('HEAD', f'refs/heads/{branch}')
+    try:
+        repo.git.fetch('--depth', '1', '--filter=blob:none', 'origin',
+                       f'+refs/heads/{branch}:refs/heads/{branch}')
+    except GitCommandError:
+        # The repository is empty
+        pass
+    return repo
+
+
+def tip_tree(repo):
+    """
+    List the files of the tip of the current branch
+    :param repo: The bare repository
+    :return: A dictionary associating the (mode, blob id) pairs to the paths
+    """
+    try:
+        listing = repo.git.ls_tree('-r', '-z', 'HEAD')
+    except GitCommandError:
+        return {}
+    entries = {}
+    for line in filter(None, listing.split('\0')):
+        meta, path = line.split('\t', 1)
+        mode, _, sha = meta.split()
+        entries[path] = (mode, sha)
+    return entries
+
+
+def blob_id(path):
+    """
+    Computes the mode and the blob id git would give a file, without writing anything
+    :param path: The file path
+    :return: A (mode, blob id, content) tuple, the content being only kept for symlinks
+    """
+    if os.path.islink(path):
+        content = os.readlink(path).encode('utf8')
+        mode = '120000'
+    else:
+        with open(path, 'rb') as file:
+            content = file.read()
+        mode = '100755' if os.stat(path).st_mode & stat.S_IXUSR else '100644'
+    sha1 = hashlib.sha1(f'blob {len(content)}\0'.encode('utf8') + content).hexdigest()
+    return mode, sha1, content if mode == '120000' else None
+
+
+def output_files(build_dir):
+    """
+    List the files of the output tree
+    :param build_dir: The output directory
+    """
+    for root, dirs, files in os.walk(build_dir):
+        dirs[:] = [i for i in dirs if i not in IGNORED_DIRS]
+        for name in files:
+            yield os.path.relpath(os.path.join(root, name), build_dir)
+
+
+def output_stats(directory, projects):
+    """
+    Measure the output of the projects
+    :param directory: The base directory
+    :param projects: The project names
+    :return: The (size, files) tuples of the output of the projects, by project
+    """
+    outputs = {}
+    for project in projects:
+        build_dir = os.path.join(directory, '.docs', project, '.build')
+        files = list(output_files(build_dir))
+        outputs[project] = (sum(os.path.getsize(os.path.join(build_dir, path)) for path in files
+                                if not os.path.islink(os.path.join(build_dir, path))), len(files))
+    return outputs
+
+
+def write_tree(repo, build_dir):
+    """
+    Write the output tree in the object database. The blobs already known from the tip are reused
+    instead of being written again.
+    :param repo: The bare repository
+    :param build_dir: The output directory
+    :return: A (tree id, number of new blobs) tuple
+    """
+    known = {sha for _, sha in tip_tree(repo).values()}
+    entries = []
+    new = []
+    for name in sorted(output_files(build_dir)):
+        path = os.path.join(build_dir, name)
+        mode, sha, link = blob_id(path)
+        if sha not in known:
+            if link is None:
+                new.append(path)
+            else:
+                # hash-object follows the links given by path, so write the link target instead
+                git_input(repo, ['hash-object', '-w', '--stdin'], link)
+        entries.append(f'{mode} {sha}\t{name.replace(os.sep, "/")}')
+
+    if new:
+        git_input(repo, ['hash-object', '-w', '--stdin-paths'], '\n'.join(new).encode('utf8'))
+
+    # Build the trees through a temporary index so that every directory is written in one pass
+    index = os.path.join(repo.git_dir, 'vizir-index')
+    if os.path.exists(index):
+        os.remove(index)
+    env = {'GIT_INDEX_FILE': index}
+    git_input(repo, ['update-index', '--add', '--index-info'],
+              '\n'.join(entries).encode('utf8'), env)
+    tree = git_input(repo, ['write-tree', '--missing-ok'], b'', env)
+    os.remove(index)
+    return tree, len(new)
+
+
+def publish(repo, build_dir, message):
+    """
+    Commit the output tree on top of the tip and push it
+    :param repo: The bare repository
+    :param build_dir: The output directory
+    :param message: The commit message
+    :return: Whether a commit was pushed
+    """
+    tree, _ = write_tree(repo, build_dir)
+    branch = repo.git.symbolic_ref('--short', 'HEAD')
+    try:
+        parent = repo.git.rev_parse('--verify', 'HEAD^{commit}')
+    except GitCommandError:
+        parent = None
+    if parent and repo.git.rev_parse(f'{parent}^{{tree}}') == tree:
+        return False
+    commit = repo.git.commit_tree(tree, *(['-p', parent] if parent else []), '-m', message)
+    repo.git.update_ref(f'refs/heads/{branch}', commit)
+    repo.git.push('origin', f'refs/heads/{branch}:refs/heads/{branch}')
+    return True
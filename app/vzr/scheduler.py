@@ -0,0 +1,85 @@
+"""This module runs the steps of a project which do not depend on each other concurrently"""
+
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .tracing import current_path, within
+from .util import captured, level
+
+
+class Scheduler:
+    """
+    This class represents a set of tasks, each one being run in a thread pool as soon as the tasks
+    it depends on are done. The output of a task is printed at once when it is done, so that the
+    outputs are not interleaved.
+    :param workers: The maximum number of tasks run concurrently
+    """
+    def __init__(self, workers=1):
+        self.workers = max(workers, 1)
+        self.tasks = {}
+        self.results = {}
+
+    def add(self, name, func, *args, after=()):
+        """
+        Add a task
+        :param name: The task name, which must be unique
+        :param func: The function to run
+        :param args: The arguments of the function
+        :param after: The names of the tasks to wait for
+        :return: The task name
+        """
+        self.tasks[name] = (func, args, set(after))
+        return name
+
+    @staticmethod
+    def execute(func, args, depth, path):
+        # pylint: disable=W0703
+        """
+        Run a task in a worker thread, capturing its output
+        :param func: The function to run
+        :param args: The arguments of the function
+        :param depth: The level of the section the task is run in
+        :param path: The path of the span the task is run in
+        :return: A (result, output, exception) tuple
+        """
+        with captured(depth) as buffer, within(path):
+            try:
+                return func(*args), buffer.getvalue(), None
+            except BaseException as e:
+                return None, buffer.getvalue(), e
+
+    def run(self):
+        """
+        Run the tasks. If one of them fails, the tasks depending on it are not run and its
+        exception is raised once the running tasks are done.
+        :return: The results of the tasks, by name
+        """
+        context = level(), current_path()
+        pending = dict(self.tasks)
+        running = {}
+        failure = None
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                if failure is None:
+                    for name in [name for name, (_, _, after) in pending.items()
+                                 if after <= set(self.results)]:
+                        func, args, _ = pending.pop(name)
+                        running[executor.submit(self.execute, func, args, *context)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                # Keep the order in which the tasks were added for the tasks done together
+                order = list(self.tasks)
+                for future in sorted(done, key=lambda future: order.index(running[future])):
+                    name = running.pop(future)
+                    result, output, exception = future.result()
+                    print(output, end='')
+                    if exception is None:
+                        self.results[name] = result
+                    elif failure is None:
+                        failure = exception
+        if failure is not None:
+            raise failure
+        if pending:
+            raise BaseException(f'Unresolved dependencies for {", ".join(pending)}')
+        return self.results
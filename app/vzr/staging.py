@@ -0,0 +1,204 @@
+"""This module stages the resources of a section in the project directory"""
+
+
+import os
+import re
+import shutil
+import fcntl
+from fnmatch import translate
+from concurrent.futures import ThreadPoolExecutor
+
+
+# The staging modes, repeated by the --staging option of vizir so that its usage does not import
+# this module
+MODES = ('copy', 'hardlink', 'reflink', 'symlink')
+
+# The ioctl request cloning a file on copy-on-write filesystems (Btrfs, XFS)
+FICLONE = 0x40049409
+
+# Below this number of files, copying in parallel is not worth it
+PARALLEL_THRESHOLD = 256
+
+
+def compile_pattern(pattern):
+    """
+    Compile a glob pattern into a list of regular expressions, one per path segment. As with
+    glob, a segment only matches a hidden name if it starts with a dot itself.
+    :param pattern: The glob pattern
+    """
+    return [(re.compile(translate(part.replace('**', '*'))), part.startswith('.'))
+            for part in os.path.normpath(pattern).split(os.sep) if part != '.']
+
+
+def match_segment(segment, name):
+    """
+    Check whether a name matches a compiled segment
+    :param segment: The compiled segment
+    :param name: The name
+    """
+    regex, hidden = segment
+    return (hidden or not name.startswith('.')) and regex.match(name) is not None
+
+
+def matches(parts, patterns):
+    """
+    Check whether a path matches one of the compiled patterns
+    :param parts: The path segments
+    :param patterns: The compiled patterns
+    """
+    return any(len(pattern) == len(parts) and all(map(match_segment, pattern, parts))
+               for pattern in patterns)
+
+
+def may_match_below(parts, patterns):
+    """
+    Check whether a path inside a directory may match one of the compiled patterns
+    :param parts: The directory path segments
+    :param patterns: The compiled patterns
+    """
+    return any(len(pattern) > len(parts) and all(map(match_segment, pattern, parts))
+               for pattern in patterns)
+
+
+def select(root, plus, minus):
+    """
+    Walk a tree once and list the entries matching a plus pattern but no minus pattern. The
+    directories which no pattern may match below are not walked.
+    :param root: The root of the tree
+    :param plus: The compiled plus patterns
+    :param minus: The compiled minus patterns
+    :return: A list of (path segments, is directory) tuples
+    """
+    selected = []
+    stack = [()]
+    while stack:
+        parts = stack.pop()
+        with os.scandir(os.path.join(root, *parts)) as entries:
+            for entry in entries:
+                entry_parts = parts + (entry.name,)
+                if entry_parts == ('.docs',) or matches(entry_parts, minus):
+                    continue
+                is_dir = entry.is_dir()
+                if matches(entry_parts, plus):
+                    selected.append((entry_parts, is_dir))
+                if is_dir and may_match_below(entry_parts, plus):
+                    stack.append(entry_parts)
+    return sorted(selected)
+
+
+def walk_files(root, parts, minus):
+    """
+    List the files and subdirectories of a selected directory, except those matching a minus
+    pattern
+    :param root: The root of the tree
+    :param parts: The directory path segments
+    :param minus: The compiled minus patterns
+    :return: A (files, directories) tuple of lists of path segments
+    """
+    files = []
+    directories = []
+    stack = [parts]
+    # The directories already walked, so that a symlink to a parent directory is not followed
+    visited = set()
+    while stack:
+        current = stack.pop()
+        stat = os.stat(os.path.join(root, *current))
+        if (stat.st_dev, stat.st_ino) in visited:
+            continue
+        visited.add((stat.st_dev, stat.st_ino))
+        directories.append(current)
+        with os.scandir(os.path.join(root, *current)) as entries:
+            for entry in entries:
+                entry_parts = current + (entry.name,)
+                if matches(entry_parts, minus):
+                    continue
+                if entry.is_dir():
+                    stack.append(entry_parts)
+                else:
+                    files.append(entry_parts)
+    return files, directories
+
+
+def _copy(source, destination):
+    """Copy a file with its metadata"""
+    shutil.copy2(source, destination)
+
+def _hardlink(source, destination):
+    """Hardlink a file, or copy it if the link fails (e.g. across filesystems)"""
+    try:
+        os.link(source, destination)
+    except OSError:
+        _copy(source, destination)
+
+def _reflink(source, destination):
+    """Clone a file on a copy-on-write filesystem, or copy it if cloning is not supported"""
+    try:
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copystat(source, destination)
+    except OSError:
+        _copy(source, destination)
+
+def _symlink(source, destination):
+    """Symlink a file"""
+    os.symlink(os.path.abspath(source), destination)
+
+
+OPERATIONS = {'copy': _copy, 'hardlink': _hardlink, 'reflink': _reflink, 'symlink': _symlink}
+
+
+def transfer(pairs, directories=(), mode='copy', jobs=None):
+    """
+    Transfer files, in parallel for large trees
+    :param pairs: The (source, destination) pairs
+    :param directories: The destination directories to create even if they stay empty
+    :param mode: The staging mode, amongst MODES
+    :param jobs: The maximum number of parallel transfers
+    """
+    operation = OPERATIONS[mode]
+    for directory in {os.path.dirname(destination) for _, destination in pairs} | set(directories):
+        os.makedirs(directory, exist_ok=True)
+
+    def run(pair):
+        if os.path.lexists(pair[1]):
+            os.remove(pair[1])
+        operation(*pair)
+
+    if len(pairs) < PARALLEL_THRESHOLD:
+        for pair in pairs:
+            run(pair)
+    else:
+        with ThreadPoolExecutor(max_workers=jobs or min(32, 4 * (os.cpu_count() or 1))) as pool:
+            # Consume the results to raise the exceptions
+            list(pool.map(run, pairs))
+
+
+def stage(root, plus, minus, destination, mode='copy'):
+    """
+    Stage the entries of a tree matching the plus patterns but not the minus patterns. Matching
+    files are put in the destination directory and matching directories are put there with their
+    content, minus the entries matching the minus patterns.
+    :param root: The root of the tree
+    :param plus: The plus glob patterns
+    :param minus: The minus glob patterns
+    :param destination: The destination directory
+    :param mode: The staging mode, amongst MODES
+    :return: The number of staged files
+    """
+    plus = [compile_pattern(pattern) for pattern in plus]
+    minus = [compile_pattern(pattern) for pattern in minus]
+    # The sources, indexed by destination so that overlapping matches are only transferred once
+    sources = {}
+    directories = set()
+    for parts, is_dir in select(root, plus, minus):
+        if is_dir:
+            files, subdirectories = walk_files(root, parts, minus)
+            offset = len(parts) - 1
+            sources.update((os.path.join(destination, *file_parts[offset:]),
+                            os.path.join(root, *file_parts)) for file_parts in files)
+            directories |= {os.path.join(destination, *dir_parts[offset:])
+                            for dir_parts in subdirectories}
+        else:
+            sources[os.path.join(destination, parts[-1])] = os.path.join(root, *parts)
+    transfer([(source, dest) for dest, source in sources.items()], directories, mode)
+    return len(sources)
@@ -0,0 +1,82 @@
+"""This module provides the registry of the section templates"""
+
+
+import os
+
+import yaml
+from jinja2 import Environment
+
+
+BUNDLED = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'templates.yml')
+SEARCH_PATH_VARIABLE = 'VIZIR_TEMPLATES'
+
+# Rendered in place of the source path so that the templates are only parsed once
+PLACEHOLDER = '__VIZIR_SOURCE_PATH__'
+
+
+def template_files(search_path):
+    """
+    List the template files of a search path, whose entries are either files or directories of
+    .yml files
+    :param search_path: The search path
+    """
+    files = []
+    for entry in search_path:
+        if os.path.isdir(entry):
+            files += sorted(os.path.join(entry, name) for name in os.listdir(entry)
+                            if name.endswith(('.yml', '.yaml')))
+        elif os.path.isfile(entry):
+            files.append(entry)
+    return files
+
+
+def substitute(value, source_path):
+    """
+    Substitute the source path for the placeholder in a parsed template
+    :param value: The parsed template
+    :param source_path: The Python representation of the source path
+    """
+    if isinstance(value, str):
+        return value.replace(PLACEHOLDER, source_path)
+    if isinstance(value, list):
+        return [substitute(i, source_path) for i in value]
+    if isinstance(value, dict):
+        return {key: substitute(val, source_path) for key, val in value.items()}
+    return value
+
+
+class TemplateRegistry:
+    """
+    This class represents the registry of the section templates. The bundled templates are loaded
+    first, then the ones of the search path, which may override them.
+    :param search_path: Additional template files or directories of template files
+    """
+    def __init__(self, search_path=()):
+        self.templates = {}
+        self.rendered = {}
+        env_path = os.environ.get(SEARCH_PATH_VARIABLE, '')
+        for path in [BUNDLED] + template_files(list(search_path) + env_path.split(os.pathsep)):
+            self.load(path)
+
+    def load(self, path):
+        """
+        Parse a template file once, with a placeholder for the source path
+        :param path: The template file path
+        """
+        with open(path, 'r', encoding='utf8') as file:
+            source = file.read()
+        rendered = Environment().from_string(source).render({'source_path': PLACEHOLDER})
+        self.templates.update(yaml.safe_load(rendered) or {})
+
+    def get(self, template, section):
+        """
+        Get a template rendered for a section. The result is memoized and must not be modified.
+        :param template: The template name
+        :param section: The section name, which is also the source path
+        """
+        if template not in self.templates:
+            raise BaseException(f'Template {template} not found')
+        key = (template, section)
+        if key not in self.rendered:
+            self.rendered[key] = substitute(self.templates[template], repr(section))
+        return self.rendered[key]
@@ -0,0 +1,164 @@
+"""This module records the wall time, CPU time and peak memory of the sections and steps"""
+
+
+import os
+import re
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager
+
+
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+# The finished spans of the run, as Chrome trace events
+EVENTS = []
+
+
+class _Local(threading.local):
+    # pylint: disable=R0903
+    """
+    This class represents the spans being recorded by a thread, the innermost one last, and the
+    path of the span the thread works for
+    """
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+        self.base = []
+
+
+_LOCAL = _Local()
+
+
+def _stack():
+    """Get the spans being recorded by the current thread"""
+    return _LOCAL.stack
+
+
+def current_path():
+    """Get the path of the innermost span being recorded by the current thread"""
+    return _LOCAL.base + [span.name for span in _LOCAL.stack]
+
+
+@contextmanager
+def within(path):
+    """
+    Record the spans of the current thread inside the context as nested in another span, which is
+    used by the threads working for another one
+    :param path: The path of the span
+    """
+    previous = _LOCAL.base
+    _LOCAL.base = list(path)
+    try:
+        yield
+    finally:
+        _LOCAL.base = previous
+
+
+def plain(string):
+    """
+    Remove the colors from a string
+    :param string: The string
+    """
+    return ANSI_ESCAPE.sub('', str(string))
+
+
+def cpu_time():
+    """Get the CPU time used by the process and its terminated children, in seconds"""
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def current_rss():
+    """Get the resident set size of the process, in kB, or its peak if it cannot be measured"""
+    try:
+        with open('/proc/self/statm', 'r', encoding='utf8') as file:
+            return int(file.read().split()[1]) * PAGE_SIZE // 1024
+    except (OSError, IndexError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def record_rss(rss):
+    """
+    Record the peak resident set size of a subprocess in the spans being recorded by the current
+    thread
+    :param rss: The resident set size, in kB
+    """
+    for span in _stack():
+        span.peak_rss = max(span.peak_rss, rss)
+
+
+class Span:
+    # pylint: disable=R0903
+    """
+    This class represents a section or a step being recorded, its peak memory being the largest
+    of the resident set size of the process when it starts and ends and of the subprocesses run
+    within it
+    :param name: The name of the section or step
+    :param category: Either 'section' or 'step'
+    """
+    def __init__(self, name, category):
+        self.name = plain(name)
+        self.category = category
+        stack = _stack()
+        self.path = current_path()
+        self.timestamp = time.time()
+        self.clock = time.perf_counter()
+        self.cpu = cpu_time()
+        self.peak_rss = current_rss()
+        stack.append(self)
+
+    def end(self, failed=False):
+        """
+        Stop recording the span
+        :param failed: Whether the section or step failed
+        """
+        stack = _stack()
+        if self in stack:
+            stack.remove(self)
+        EVENTS.append({'name': self.name, 'cat': self.category, 'ph': 'X',
+                       'ts': int(self.timestamp * 1e6),
+                       'dur': int((time.perf_counter() - self.clock) * 1e6),
+                       'pid': os.getpid(), 'tid': threading.get_ident(),
+                       'args': {'path': self.path, 'cpu': round(cpu_time() - self.cpu, 3),
+                                'peak_rss': max(self.peak_rss, current_rss()),
+                                'failed': failed}})
+
+
+def reset():
+    """Forget the recorded spans, at the beginning of a run"""
+    EVENTS.clear()
+
+
+def merge(events):
+    """
+    Add the spans recorded by a worker process
+    :param events: The events recorded by the worker
+    """
+    EVENTS.extend(events)
+
+
+def slowest(count=10, category='step'):
+    """
+    Get the slowest spans
+    :param count: The number of spans
+    :param category: The category of the spans
+    """
+    events = [event for event in EVENTS if event['cat'] == category]
+    return sorted(events, key=lambda event: -event['dur'])[:count]
+
+
+def write_trace(path):
+    """
+    Write the recorded spans in the Chrome trace format, which Perfetto also reads
+    :param path: The trace file path
+    """
+    main = os.getpid()
+    names = [{'name': 'process_name', 'ph': 'M', 'pid': pid,
+              'args': {'name': 'vizir' if pid == main else f'vizir worker {pid}'}}
+             for pid in sorted({event['pid'] for event in EVENTS})]
+    with open(path, 'w', encoding='utf8') as file:
+        json.dump({'traceEvents': names + EVENTS, 'displayTimeUnit': 'ms'}, file)
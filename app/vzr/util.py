@@ -1,11 +1,15 @@
-# pylint: disable=W0603
 """This module provides text printers"""
 
 
+import io
 import sys
+import threading
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
 
 from termcolor import colored as _colored
 
+from .tracing import Span
+
 
 def colored(string, color, on=None, reverse=False):
     """Color a string"""
@@ -31,20 +35,40 @@ def grey(string, on=None, reverse=False):
     return colored(string, 'grey', on, reverse)
 
 
-LEVEL=0
+class _State(threading.local):
+    # pylint: disable=R0903
+    """
+    This class represents the output state of a thread: the level of the current section, and the
+    buffer capturing the output if any
+    """
+    level = 0
+    stream = None
+
+
+_STATE = _State()
 COLORS = (blue, cyan, grey)
 
 
+def _out():
+    """Get the stream the current thread prints to"""
+    return _STATE.stream or sys.stdout
+
+
 def _print(string=''):
     """Print a string with the right level"""
     line = ''
-    for i in range(LEVEL-1):
+    for i in range(_STATE.level-1):
         line += COLORS[i](' ', reverse=True)
         #line += ' '
         line += COLORS[i+1](' ', reverse=True)
-    if LEVEL > 0:
-        line += COLORS[LEVEL-1](' ', reverse=True)
-    print(line + string)
+    if _STATE.level > 0:
+        line += COLORS[_STATE.level-1](' ', reverse=True)
+    print(line + string, file=_out())
+
+
+def level():
+    """Get the level of the current section"""
+    return _STATE.level
 
 
 def color_join(string, elements, color):
@@ -52,9 +76,13 @@ def color_join(string, elements, color):
     return string.join(color(element) for element in elements)
 
 
-def err(string=''):
-    """Print an error"""
+def error(string=''):
+    """Print an error without exiting"""
     _print(f'{colored(" ERROR ", "red", reverse=True)} {string}')
+
+def err(string=''):
+    """Print an error and exit"""
+    error(string)
     sys.exit(1)
 
 def warn(string=''):
@@ -70,6 +98,53 @@ def info(string=''):
     _print(f'{colored(" INFO  ", "magenta", reverse=True)} {string}')
 
 
+class _Buffer(io.StringIO):
+    """
+    This class represents an output buffer which reports the terminal capabilities of the stream it
+    replaces, so that buffered lines keep their colors
+    :param stream: The replaced stream
+    """
+    def __init__(self, stream):
+        super().__init__()
+        self.stream = stream
+
+    def isatty(self):
+        """Whether the replaced stream is a terminal"""
+        return self.stream.isatty()
+
+
+@contextmanager
+def buffered():
+    """
+    Capture everything printed inside the context in a buffer, starting from the top level. This is
+    used by concurrent workers, whose output must not be interleaved
+    """
+    previous = _STATE.level
+    _STATE.level = 0
+    buffer = _Buffer(sys.stdout)
+    try:
+        with redirect_stdout(buffer), redirect_stderr(buffer):
+            yield buffer
+    finally:
+        _STATE.level = previous
+
+
+@contextmanager
+def captured(depth):
+    """
+    Capture everything the current thread prints with these functions inside the context in a
+    buffer, starting from the given level. This is used by concurrent threads, whose output must
+    not be interleaved
+    :param depth: The level of the section the thread works for
+    """
+    previous = _STATE.level, _STATE.stream
+    _STATE.level, _STATE.stream = depth, _Buffer(sys.stdout)
+    try:
+        yield _STATE.stream
+    finally:
+        _STATE.level, _STATE.stream = previous
+
+
 def _bc(color, on=None):
     """Format a breadcrumb joiner"""
     return color(' ', reverse=True) + color('', on=on)
@@ -77,8 +152,7 @@ def _bc(color, on=None):
 
 def header(string):
     """Print a header"""
-    global LEVEL
-    LEVEL = 0
+    _STATE.level = 0
     _print(f'{blue(f" {string}", reverse=True)}{_bc(blue)}')
 
 
@@ -89,23 +163,25 @@ class Section:
     """
     def __init__(self, string):
         line = ''
-        for i in range(LEVEL+1):
+        for i in range(_STATE.level+1):
             line += _bc(COLORS[i], COLORS[i+1].__name__)
         line += COLORS[i+1](f" {string}", reverse=True) + _bc(COLORS[i+1])
         self.line = line
+        self.string = string
+        self.span = None
 
     def __enter__(self):
-        """Print the string and increase the level"""
-        global LEVEL
+        """Print the string, increase the level and start recording the section"""
         _print()
-        print(self.line)
-        LEVEL += 1
+        print(self.line, file=_out())
+        _STATE.level += 1
+        self.span = Span(self.string, 'section')
         return self
 
     def __exit__(self, e_ty, e_val, e_trace):
-        """Decrease the level"""
-        global LEVEL
-        LEVEL -=1
+        """Decrease the level and stop recording the section"""
+        self.span.end(e_ty is not None)
+        _STATE.level -=1
         _print()
 
 
@@ -137,14 +213,17 @@ class Step:
                     sentence[0] = f'{first_word[:-3]}ed'
                 self.success = ' '.join(sentence) + ' ' * (len(first_word) - len(sentence[0]))
         self.single_line = success == '' if single_line is None else single_line
+        self.span = None
 
     def __enter__(self):
-        """Print the string"""
+        """Print the string and start recording the step"""
         info(self.string)
+        self.span = Span(self.string, 'step')
         return self
 
     def __exit__(self, e_ty, e_val, e_trace):
         """If an exception is raised, display an error message, else display an ok message"""
+        self.span.end(e_ty is not None)
         if e_ty == SystemExit:
             raise
         if e_ty is not None:
@@ -152,5 +231,5 @@ class Step:
                 err(e_val)
             err(f'Exception {mag(e_ty.__name__)} raised: {e_val}')
         if self.single_line:
-            print('\033[F', end='')
+            print('\033[F', end='', file=_out())
         ok(self.success)
@@ -2,11 +2,31 @@
 
 
 import os
+import sys
+import glob
+import json
+import hashlib
+
 import yaml
 
-from .constants import POLICIES
+from .constants import CACHE_DIR, POLICIES, VERSION
 from .util import header, Step
-from .yava.validator import validate as _validate
+from .yava.validator import check, validate as _validate
+
+
+# The libyaml loader is much faster than the pure Python one, but it is optional
+Loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+CACHE_FILE = os.path.join(CACHE_DIR, 'validate.json')
+
+
+def load(path):
+    """
+    Load a YAML file
+    :param path: The file path
+    """
+    with open(path, 'r', encoding='utf8') as file:
+        return yaml.load(file, Loader=Loader)
 
 
 def validate(directory="."):
@@ -17,6 +37,144 @@ def validate(directory="."):
     """
     header('Vizir Validator')
     with Step('Checking the .docs.yml file', single_line=False):
-        with open(os.path.join(directory, '.docs.yml'), 'r', encoding='utf8') as file:
-            conf = yaml.safe_load(file)
-        _validate(conf, POLICIES)
+        _validate(load(os.path.join(directory, '.docs.yml')), POLICIES)
+
+
+def validate_file(path, stamp):
+    # pylint: disable=W0703
+    """
+    Validate a Vizir file in a worker
+    :param path: The file path
+    :param stamp: The modification time, size and hash of the file
+    :return: The result, as a JSON-serializable dictionary
+    """
+    result = {'file': path, 'stamp': stamp, 'cached': False}
+    try:
+        report = check(load(path), POLICIES)
+    except Exception as e:
+        return {**result, 'valid': False,
+                'exception': f'{type(e).__name__}: {e}', 'errors': [], 'warnings': []}
+    return {**result, 'valid': not report.errors,
+            'errors': [issue.to_dict() for issue in report.errors],
+            'warnings': [issue.to_dict() for issue in report.warnings]}
+
+
+def file_stamp(path, previous=None):
+    """
+    Computes the stamp of a file. The file is only hashed if its modification time or size
+    changed since the previous stamp.
+    :param path: The file path
+    :param previous: The previous stamp, if any
+    :return: A [modification time, size, hash] list
+    """
+    stat = os.stat(path)
+    if previous and previous[:2] == [stat.st_mtime_ns, stat.st_size]:
+        return previous
+    with open(path, 'rb') as file:
+        digest = hashlib.sha1(file.read()).hexdigest()
+    return [stat.st_mtime_ns, stat.st_size, digest]
+
+
+def cache_key():
+    """
+    Compute the key of the cached results, which are only valid for the same policies and
+    validator, hence for the same sources of the vzr package
+    """
+    sha256 = hashlib.sha256(VERSION.encode('utf8'))
+    package_dir = os.path.dirname(os.path.realpath(__file__))
+    for path in sorted(glob.glob(os.path.join(package_dir, '**', '*.py'), recursive=True)):
+        with open(path, 'rb') as file:
+            sha256.update(os.path.relpath(path, package_dir).encode('utf8') + b'\0')
+            sha256.update(hashlib.sha256(file.read()).digest())
+    return sha256.hexdigest()
+
+
+def load_results(key):
+    """
+    Load the cached results of the previous validations
+    :param key: The cache key, see cache_key
+    :return: The results, by file path
+    """
+    try:
+        with open(CACHE_FILE, 'r', encoding='utf8') as file:
+            cache = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+    return cache.get('results', {}) if cache.get('key') == key else {}
+
+
+def match_directories(patterns, report):
+    """
+    List the directories matching some patterns, reporting the patterns matching none as invalid
+    :param patterns: The directories or glob patterns of directories
+    :param report: The report
+    """
+    directories = set()
+    for pattern in patterns:
+        matched = {os.path.abspath(directory) for directory in glob.glob(pattern)
+                   if os.path.isdir(directory)}
+        if not matched:
+            report[pattern] = {'file': None, 'valid': False, 'cached': False,
+                               'exception': 'No directory matches the pattern', 'errors': [],
+                               'warnings': []}
+        directories |= matched
+    return sorted(directories)
+
+
+def stale_files(directories, results, report):
+    """
+    Report the cached results of the files which did not change, and list the other ones
+    :param directories: The directories
+    :param results: The cached results, by file path
+    :param report: The report
+    :return: The (directory, path, stamp) tuples of the files to validate
+    """
+    pending = []
+    for directory in directories:
+        path = os.path.join(directory, '.docs.yml')
+        if not os.path.isfile(path):
+            report[directory] = {'file': path, 'valid': False, 'cached': False,
+                                 'exception': 'No .docs.yml file found', 'errors': [],
+                                 'warnings': []}
+            continue
+        previous = results.get(path)
+        stamp = file_stamp(path, previous and previous['stamp'])
+        if previous and previous['stamp'][2] == stamp[2]:
+            report[directory] = {**previous, 'stamp': stamp, 'cached': True}
+        else:
+            pending.append((directory, path, stamp))
+    return pending
+
+
+def validate_many(patterns, jobs=None):
+    """
+    Validate the Vizir files of many directories in a process pool and print a JSON report. The
+    results of the files which did not change since the last validation are reused.
+    :param patterns: The directories or glob patterns of directories
+    :param jobs: The maximum number of files validated concurrently
+    """
+    key = cache_key()
+    results = load_results(key)
+    report = {}
+    pending = stale_files(match_directories(patterns, report), results, report)
+
+    if pending:
+        # Only imported here since multiprocessing is slow to import
+        from concurrent.futures import ProcessPoolExecutor  # pylint: disable=C0415
+        with ProcessPoolExecutor(max_workers=min(jobs or os.cpu_count() or 1,
+                                                 len(pending))) as executor:
+            futures = {directory: executor.submit(validate_file, path, stamp)
+                       for directory, path, stamp in pending}
+            for directory, future in futures.items():
+                report[directory] = future.result()
+
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    with open(CACHE_FILE, 'w', encoding='utf8') as file:
+        json.dump({'key': key, 'results': {**results, **{
+            result['file']: result for result in report.values() if 'stamp' in result}}}, file)
+
+    json.dump({'valid': all(result['valid'] for result in report.values()),
+               'repositories': report}, sys.stdout, indent=2, sort_keys=True)
+    print()
+    if not all(result['valid'] for result in report.values()):
+        sys.exit(1)
@@ -0,0 +1,176 @@
+"""This module compiles policies into validators checking a structure in a single pass"""
+
+
+from .primitives import is_dict, is_list
+from ..util import color_join, mag
+
+
+class Issue:
+    """
+    This class represents an error or a warning raised by a validator
+    :param level: Either 'error' or 'warning'
+    :param kind: The kind of issue: 'check', 'mismatch', 'unexpected' or 'missing'
+    :param field: The field concerned, or the list of missing fields
+    :param branch: The named branch in which the issue was found
+    :param detail: The failed check name, or the (expected, got) type names of a mismatch
+    """
+    def __init__(self, level, kind, field, branch, detail=None):
+        # pylint: disable=R0913,R0917
+        self.level = level
+        self.kind = kind
+        self.field = field
+        self.branch = branch
+        self.detail = detail
+
+    def message(self, color=mag):
+        """
+        Format the issue
+        :param color: The function highlighting the names
+        """
+        branch = color_join(':', self.branch, color) or color('<TOP>')
+        if self.kind == 'check':
+            return f'{color(self.field)} failed the check {color(self.detail)} in branch {branch}'
+        if self.kind == 'mismatch':
+            return (f'{color(self.field)} has a structural mismatch (expected '
+                    f'{color(self.detail[0])}, got {color(self.detail[1])}) in branch {branch}')
+        if self.kind == 'unexpected':
+            return f'Unexpected field {color(self.field)} in branch {branch}'
+        field_str = 'field' if len(self.field) == 1 else 'fields'
+        return f'Missing {field_str} {color_join(", ", self.field, color)} in branch {branch}'
+
+    def to_dict(self):
+        """Get a JSON-serializable representation of the issue"""
+        return {'level': self.level, 'kind': self.kind, 'field': self.field,
+                'branch': list(self.branch), 'detail': self.detail,
+                'message': self.message(str)}
+
+
+class Report:
+    """This class represents the issues found while validating a structure"""
+    def __init__(self):
+        self.issues = []
+
+    def add(self, *args):
+        """Add an issue, see Issue for the arguments"""
+        self.issues.append(Issue(*args))
+
+    @property
+    def errors(self):
+        """The issues of level error"""
+        return [issue for issue in self.issues if issue.level == 'error']
+
+    @property
+    def warnings(self):
+        """The issues of level warning"""
+        return [issue for issue in self.issues if issue.level == 'warning']
+
+
+class Leaf:
+    # pylint: disable=R0903
+    """
+    This class represents a validator checking a value with a predicate
+    :param check: The predicate
+    """
+    def __init__(self, check):
+        self.check = check
+        self.name = check.__name__
+
+    def validate(self, value, field, where, _inner, report):
+        # pylint: disable=R0913,R0917
+        """
+        Validate a value
+        :param value: The value
+        :param field: The field holding the value
+        :param where: The named branch the value is reported in
+        :param _inner: The named branch of the value's own fields, unused
+        :param report: The report to add the issues to
+        """
+        if not self.check(value):
+            report.add('error', 'check', field, where, self.name)
+
+
+class Sequence:
+    # pylint: disable=R0903
+    """
+    This class represents a validator checking every element of a list, a single value being
+    considered as a 1-element list
+    :param element: The validator of the elements
+    """
+    def __init__(self, element):
+        self.element = element
+
+    def validate(self, value, field, where, _inner, report):
+        # pylint: disable=R0913,R0917
+        """Validate a value, see Leaf.validate"""
+        if is_list(value):
+            for i, val in enumerate(value):
+                branch = where + (field, f'#{i}')
+                self.element.validate(val, field, branch, branch, report)
+        else:
+            branch = where + (field, '#')
+            self.element.validate(value, field, branch, branch, report)
+
+
+class Mapping:
+    # pylint: disable=R0903
+    """
+    This class represents a validator checking the fields of a dictionary w.r.t. a metapolicy
+    :param policy: The policy dictionary
+    """
+    def __init__(self, policy):
+        errors = policy.get('_error', set())
+        warnings = policy.get('_warning', set())
+        self.required = errors - {'@'}
+        self.recommended = warnings - {'@'}
+        self.unexpected = 'error' if '@' in errors else 'warning' if '@' in warnings else None
+        self.children = {key: compile_policy(val) for key, val in policy.items()
+                         if key not in ('_error', '_warning', '*')}
+        self.wildcard = compile_policy(policy['*']) if '*' in policy else None
+
+    def validate(self, value, field, where, inner, report):
+        # pylint: disable=R0913,R0917
+        """Validate a value, see Leaf.validate"""
+        if not is_dict(value):
+            report.add('error', 'mismatch', field, where, ('dict', type(value).__name__))
+            return
+        fields = set()
+        for key, val in value.items():
+            child = self.children.get(key)
+            if child is None:
+                if self.unexpected:
+                    report.add(self.unexpected, 'unexpected', key, inner)
+                if self.wildcard is None:
+                    continue
+                child = self.wildcard
+                fields.add('*')
+            else:
+                fields.add(key)
+            child.validate(val, key, inner, inner + (key,), report)
+        for level, policy_fields in (('error', self.required), ('warning', self.recommended)):
+            miss = policy_fields - fields
+            if miss:
+                report.add(level, 'missing', sorted(miss), inner)
+
+
+def compile_policy(policy):
+    """
+    Compile a policy into a validator
+    :param policy: A predicate, a 1-element list of policy or a policy dictionary
+    """
+    if callable(policy):
+        return Leaf(policy)
+    if is_list(policy):
+        return Sequence(compile_policy(policy[0]))
+    return Mapping(policy)
+
+
+def validate(dic, validator):
+    """
+    Validate a structure in a single pass, collecting every issue
+    :param dic: The structure
+    :param validator: The compiled policies
+    :return: The report
+    """
+    report = Report()
+    validator.validate(dic, None, (), (), report)
+    return report
@@ -10,3 +10,4 @@ def is_str(x): return _(str)(x)
 def is_str_or_number(x): return _(float, int, str)(x)
 def is_list(x): return _(list)(x)
 def is_dict(x): return _(dict)(x)
+def is_job_count(x): return x == 'auto' or (_(int)(x) and not _(bool)(x) and x > 0)
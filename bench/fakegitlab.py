@@ -0,0 +1,107 @@
+"""This module provides a minimal GitLab API stand-in for the benchmarks"""
+
+
+import json
+import threading
+from urllib.parse import unquote
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeGitLab:
+    """
+    This class represents a GitLab server only knowing the groups and projects, enough for the
+    lookups and creations of the processor
+    :param projects: The paths of the projects which already exist
+    """
+    def __init__(self, projects=()):
+        self.lock = threading.Lock()
+        self.groups = {}
+        self.projects = {}
+        self.requests = 0
+        for path in projects:
+            self.create('projects', path)
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        """The base URL of the server"""
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def create(self, kind, path):
+        """
+        Create a group or a project, with its parent groups
+        :param kind: Either 'groups' or 'projects'
+        :param path: The path
+        """
+        with self.lock:
+            parts = path.split('/')
+            for i in range(1, len(parts)):
+                self.groups.setdefault('/'.join(parts[:i]), len(self.groups) + 1)
+            entries = getattr(self, kind)
+            return entries.setdefault(path, len(entries) + 1)
+
+    def handler(self):
+        """Create the request handler class"""
+        gitlab = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """This class handles the API requests"""
+            def reply(self, code, body):
+                """Send a JSON reply"""
+                self.send_response(code)
+                data = json.dumps(body).encode('utf8')
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                # pylint: disable=C0103
+                """Get the current user, a group or a project"""
+                gitlab.requests += 1
+                parts = self.path.split('?')[0].split('/')[3:]
+                if parts == ['user']:
+                    return self.reply(200, {'id': 1, 'username': 'vizir'})
+                if len(parts) == 2 and parts[0] in ('groups', 'projects'):
+                    path = unquote(parts[1])
+                    entries = getattr(gitlab, parts[0])
+                    if path in entries:
+                        return self.reply(200, {'id': entries[path], 'path': path,
+                                                'path_with_namespace': path})
+                return self.reply(404, {'message': '404 Not found'})
+
+            def do_POST(self):
+                # pylint: disable=C0103
+                """Create a group or a project"""
+                gitlab.requests += 1
+                kind = self.path.split('?')[0].split('/')[3]
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                                  or b'{}')
+                if kind == 'groups':
+                    parent = [path for path, ident in gitlab.groups.items()
+                              if ident == body.get('parent_id')]
+                    path = '/'.join(parent + [body['path']])
+                else:
+                    namespace = [path for path, ident in gitlab.groups.items()
+                                 if ident == body.get('namespace_id')]
+                    path = '/'.join(namespace + [body['path']])
+                ident = gitlab.create(kind, path)
+                return self.reply(201, {'id': ident, 'path': body['path'], 'name': body['name']})
+
+            def log_message(self, format, *args):
+                # pylint: disable=W0622
+                """Silence the request logs"""
+
+        return Handler
+
+    def __enter__(self):
+        """Start serving in a thread"""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, e_ty, e_val, e_trace):
+        """Stop serving"""
+        self.server.shutdown()
+        self.server.server_close()
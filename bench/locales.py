@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+
+
+"""
+This script checks that the locales built in a shared Sphinx process (--shared-locales) are the
+same as the locales built each in its own process, the built-in strings of Sphinx and of the
+extensions included
+"""
+
+
+import os
+import sys
+import json
+import filecmp
+import tempfile
+from argparse import ArgumentParser
+
+
+APP_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'app')
+
+CONF_PY = """\
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath('..'))
+
+project = 'Vizir'
+extensions = ['sphinx.ext.autodoc', 'sphinx.ext.viewcode']
+"""
+
+INDEX_RST = """\
+Vizir
+=====
+
+.. automodule:: sample
+   :members:
+
+* :ref:`genindex`
+* :ref:`modindex`
+* :ref:`search`
+"""
+
+SAMPLE_PY = '''\
+"""A documented module"""
+
+
+def function(value):
+    """
+    Return a value
+    :param value: The value
+    """
+    return value
+'''
+
+
+def generate(directory):
+    """
+    Generate a project documenting a module
+    :param directory: The project directory
+    :return: The documentation directory
+    """
+    docs_dir = os.path.join(directory, '.docs')
+    os.makedirs(docs_dir)
+    for path, content in ((os.path.join(docs_dir, 'conf.py'), CONF_PY),
+                          (os.path.join(docs_dir, 'index.rst'), INDEX_RST),
+                          (os.path.join(directory, 'sample.py'), SAMPLE_PY)):
+        with open(path, 'w', encoding='utf8') as file:
+            file.write(content)
+    return docs_dir
+
+
+def build(docs_dir, locales, shared):
+    # pylint: disable=C0415
+    """
+    Build the locales of a project
+    :param docs_dir: The documentation directory
+    :param locales: The locales, the first one being the main one
+    :param shared: Whether to build them in a shared Sphinx process
+    """
+    from vzr.builder import build_arguments, run_build
+
+    builds = [[locale, build_arguments(locale, i == 0)] for i, locale in enumerate(locales)]
+    runs = [run_build(docs_dir, [json.dumps(builds)], module='vzr.multilocale')] if shared else \
+        [run_build(docs_dir, arguments) for _, arguments in builds]
+    for status, output, _, _ in runs:
+        if status:
+            print(output, file=sys.stderr)
+            raise SystemExit(f'The {"shared" if shared else "separate"} build exited with status '
+                             f'{status}')
+
+
+def differences(first, second):
+    """
+    List the files which differ between two directories
+    :param first: The first directory
+    :param second: The second directory
+    :return: The paths of the differing files, relative to the directories
+    """
+    comparison = filecmp.dircmp(first, second)
+    paths = comparison.left_only + comparison.right_only + comparison.diff_files + \
+        comparison.funny_files
+    for name in comparison.common_dirs:
+        paths += [os.path.join(name, path)
+                  for path in differences(os.path.join(first, name), os.path.join(second, name))]
+    return sorted(paths)
+
+
+def main():
+    """Run the check"""
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--locales', default='fr,de,es',
+                        help='comma-separated locales, the first one being the main one '
+                             '(default: fr,de,es)')
+    args = parser.parse_args()
+    locales = args.locales.split(',')
+
+    sys.path.insert(0, APP_DIR)
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        outputs = {}
+        for mode in ('separate', 'shared'):
+            docs_dir = generate(os.path.join(directory, mode))
+            build(docs_dir, locales, mode == 'shared')
+            outputs[mode] = os.path.join(directory, mode, '.build')
+        for locale in locales:
+            paths = differences(os.path.join(outputs['separate'], locale),
+                                os.path.join(outputs['shared'], locale))
+            print(f'{locale}: {len(paths)} differing files')
+            problems += [f'{locale}/{path} differs' for path in paths]
+
+    for problem in problems:
+        print(f'FAIL {problem}', file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/python3
+
+
+"""
+This script benchmarks the processing pipeline on a synthetic Vizir file, whose remote
+repositories are local bare repositories and whose GitLab is a local stand-in. Every stage is timed
+separately and the results are written as JSON, which can be compared with a baseline.
+"""
+
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import functools
+import threading
+import statistics
+import subprocess
+from argparse import ArgumentParser
+from collections import defaultdict
+
+from fakegitlab import FakeGitLab
+
+
+APP_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'app')
+
+LOCALES = ('fr', 'en', 'de', 'es', 'it', 'nl', 'pt', 'pl')
+
+# The processor functions timed, with their stage names
+STAGES = {'acquire_build_repository': 'acquire', 'acquire_sources': 'get_resources',
+          'get_resources': 'get_resources', 'prepare_templates': 'prepare_templates',
+          'freeze_expr_lists': 'build_sphinx_config', 'build_sphinx_config': 'build_sphinx_config',
+          'generate_documentation': 'sphinx',
+          'push_build_repository': 'push'}
+
+# Below this difference, in seconds, a stage is never considered as regressed
+NOISE_FLOOR = 0.01
+
+GIT_IDENTITY = {'GIT_AUTHOR_NAME': 'Vizir', 'GIT_AUTHOR_EMAIL': 'vizir@resel.fr',
+                'GIT_COMMITTER_NAME': 'Vizir', 'GIT_COMMITTER_EMAIL': 'vizir@resel.fr'}
+
+
+def git(*args, cwd=None):
+    """
+    Run a git command
+    :param args: The arguments
+    :param cwd: The working directory
+    """
+    subprocess.run(['git', *args], cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+
+
+def make_remote(remotes, path, files):
+    """
+    Create a bare remote repository with an initial commit
+    :param remotes: The directory of the remote repositories
+    :param path: The repository path
+    :param files: The files of the initial commit, as a {path: content} dictionary
+    """
+    seed = tempfile.mkdtemp()
+    try:
+        for name, content in files.items():
+            os.makedirs(os.path.join(seed, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(seed, name), 'w', encoding='utf8') as file:
+                file.write(content)
+        git('init', '-q', seed)
+        git('add', '-A', cwd=seed)
+        git('commit', '-q', '-m', 'Initial commit', cwd=seed)
+        git('init', '-q', '--bare', os.path.join(remotes, path))
+        git('push', '-q', os.path.join(remotes, path), 'HEAD:master', cwd=seed)
+    finally:
+        shutil.rmtree(seed)
+
+
+def module(repo, index):
+    """
+    Generate a documented Python module
+    :param repo: The repository index
+    :param index: The module index
+    """
+    functions = ''.join(f'\n\ndef function_{i}(value):\n'
+                        f'    """\n    Compute something\n    :param value: The value\n'
+                        f'    :return: The value of function {i}\n    """\n    return value + {i}\n'
+                        for i in range(10))
+    return f'"""Module {index} of repository {repo}"""\n{functions}'
+
+
+def generate(workdir, args):
+    """
+    Generate the remote repositories and the directory holding the Vizir file
+    :param workdir: The directory to generate everything in
+    :param args: The parsed arguments
+    :return: The directory holding the Vizir file and the target repository paths
+    """
+    remotes = os.path.join(workdir, 'remotes')
+    for repo in range(args.repos):
+        files = {f'pkg_{repo}/__init__.py': f'"""Package {repo}"""\n'}
+        files.update({f'pkg_{repo}/mod_{i}.py': module(repo, i) for i in range(args.files)})
+        make_remote(remotes, f'lib/repo_{repo}', files)
+
+    directory = os.path.join(workdir, 'work')
+    projects = {}
+    for project in range(args.projects):
+        repo_path = f'docs/project_{project}'
+        make_remote(remotes, repo_path, {'README.md': 'Documentation\n'})
+        code = {f'section_{section}': {'from': f'lib/repo_{section % args.repos}',
+                                       'templates': 'python',
+                                       'files': {'plus': f'pkg_{section % args.repos}'}}
+                for section in range(args.sections)} if args.repos else {}
+        projects[f'project_{project}'] = {'repo': repo_path, 'version': 1, 'release': '1.0',
+                                          'copyright': 'ResEl',
+                                          'locales': list(LOCALES[:args.locales]),
+                                          'docs': {'files': {'plus': 'pages/*', 'to': '.'}},
+                                          'code': code}
+
+    os.makedirs(os.path.join(directory, 'pages'))
+    used = min(args.sections, args.repos)
+    pages = [f'page_{i}' for i in range(args.pages)]
+    with open(os.path.join(directory, 'pages', 'index.rst'), 'w', encoding='utf8') as file:
+        file.write('Benchmark\n=========\n\n.. toctree::\n\n' +
+                   ''.join(f'   {page}\n' for page in pages))
+    for i, page in enumerate(pages):
+        with open(os.path.join(directory, 'pages', f'{page}.rst'), 'w', encoding='utf8') as file:
+            file.write(f'Page {i}\n{"=" * len(f"Page {i}")}\n\n' + 'Lorem ipsum dolor sit amet. '
+                       * 20 + '\n')
+            if used and args.files:
+                file.write(f'\n.. automodule:: pkg_{i % used}.mod_{i % args.files}\n'
+                           '   :members:\n')
+
+    with open(os.path.join(directory, '.docs.yml'), 'w', encoding='utf8') as file:
+        json.dump(projects, file, indent=2)
+    return directory, [conf['repo'] for conf in projects.values()]
+
+
+class Timer:
+    # pylint: disable=R0903
+    """
+    This class represents the exclusive time spent in the stages, the time spent in a nested
+    stage being only counted for that stage. The stages run concurrently by the processor are
+    summed over the threads.
+    """
+    def __init__(self):
+        self.totals = defaultdict(float)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def wrap(self, stage, func):
+        """
+        Wrap a function so that its calls are timed
+        :param stage: The stage name
+        :param func: The function
+        """
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            stack = self.local.__dict__.setdefault('stack', [])
+            stack.append(0.0)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.totals[stage] += elapsed - stack.pop()
+                if stack:
+                    stack[-1] += elapsed
+        return timed
+
+
+def run(directory, options, timer):
+    """
+    Process the Vizir file once
+    :param directory: The directory holding the Vizir file
+    :param options: The processing options
+    :param timer: The timer of the stages
+    :return: The time spent in each stage, the total included
+    """
+    # pylint: disable=C0415
+    from vzr import forge
+    from vzr.mirrors import FETCHED
+    from vzr.processor import process
+    from vzr.util import buffered
+
+    shutil.rmtree(os.path.join(directory, '.docs'), ignore_errors=True)
+    # Every run starts with the state of a new process
+    forge.reset({'groups': {}, 'projects': {}})
+    FETCHED.clear()
+    timer.totals.clear()
+    cwd = os.getcwd()
+    os.chdir(directory)
+    start = time.perf_counter()
+    failure = None
+    try:
+        with buffered() as buffer:
+            try:
+                process(directory, **options)
+            except SystemExit as e:
+                failure = e
+    finally:
+        os.chdir(cwd)
+    if failure:
+        print(buffer.getvalue(), end='')
+        raise failure
+    return {**timer.totals, 'total': time.perf_counter() - start}
+
+
+def time_validation(directory, iterations):
+    """
+    Time the validation of the Vizir file
+    :param directory: The directory holding the Vizir file
+    :param iterations: The number of validations
+    :return: The time spent, in seconds
+    """
+    # pylint: disable=C0415
+    from vzr.constants import POLICIES
+    from vzr.validator import load
+    from vzr.yava.validator import check
+
+    conf = load(os.path.join(directory, '.docs.yml'))
+    start = time.perf_counter()
+    for _ in range(iterations):
+        check(conf, POLICIES)
+    return time.perf_counter() - start
+
+
+def summarize(runs):
+    """
+    Summarize the timings of several runs
+    :param runs: The timings of the runs
+    """
+    stages = sorted({stage for timings in runs for stage in timings})
+    return {stage: {'median': statistics.median(timings.get(stage, 0) for timings in runs),
+                    'min': min(timings.get(stage, 0) for timings in runs),
+                    'runs': [timings.get(stage, 0) for timings in runs]}
+            for stage in stages}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print the comparison of results with a baseline
+    :param results: The results
+    :param baseline: The baseline results
+    :param tolerance: The relative slowdown tolerated
+    :return: The list of the regressed stages
+    """
+    if results['parameters'] != baseline['parameters']:
+        print('Warning: the baseline was measured with other parameters', file=sys.stderr)
+    regressed = []
+    print(f'{"stage":<22}{"baseline":>12}{"current":>12}{"change":>10}')
+    for stage, current in results['stages'].items():
+        if stage not in baseline['stages']:
+            continue
+        before, after = baseline['stages'][stage]['median'], current['median']
+        change = f'{(after - before) / before:+.1%}' if before else 'n/a'
+        print(f'{stage:<22}{before:>11.3f}s{after:>11.3f}s{change:>10}')
+        if after > before * (1 + tolerance) and after - before > NOISE_FLOOR:
+            regressed.append(stage)
+    return regressed
+
+
+def parse_arguments():
+    """
+    Parse the command line arguments
+    :return: The arguments
+    """
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--projects', type=int, default=2, help='number of projects')
+    parser.add_argument('--sections', type=int, default=2, help='code sections per project')
+    parser.add_argument('--repos', type=int, default=2, help='number of `from` repositories')
+    parser.add_argument('--files', type=int, default=20, help='modules per repository')
+    parser.add_argument('--pages', type=int, default=20, help='documentation pages per project')
+    parser.add_argument('--locales', type=int, default=2, choices=range(1, len(LOCALES) + 1),
+                        help='locales per project')
+    parser.add_argument('--runs', type=int, default=3, help='measured runs')
+    parser.add_argument('--warmup', type=int, default=1, help='discarded runs before measuring')
+    parser.add_argument('--validations', type=int, default=1000,
+                        help='validations of the Vizir file per run')
+    parser.add_argument('--staging', default='copy', help='staging mode')
+    parser.add_argument('--publish', default='clone', help='publishing mode')
+    parser.add_argument('--incremental', action='store_true', help='keep the Sphinx environment')
+    parser.add_argument('--io-jobs', type=int, default=4,
+                        help='repositories acquired and sections staged concurrently')
+    parser.add_argument('--workdir', help='directory to generate the repositories in '
+                                          '(default: a temporary directory)')
+    parser.add_argument('-o', '--output', help='file to write the results to')
+    parser.add_argument('--baseline', help='results to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='relative slowdown tolerated w.r.t. the baseline (default 0.2)')
+    return parser.parse_args()
+
+
+def main():
+    # pylint: disable=R0914
+    """Run the benchmark"""
+    args = parse_arguments()
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp()
+    if os.path.exists(os.path.join(workdir, 'work')):
+        sys.exit(f'{workdir} already holds a benchmark, remove it first')
+    for key, value in GIT_IDENTITY.items():
+        os.environ.setdefault(key, value)
+
+    try:
+        directory, targets = generate(workdir, args)
+        with FakeGitLab(targets) as gitlab:
+            # The constants are read from the environment when vzr is imported
+            os.environ['VIZIR_REMOTE'] = f'file://{os.path.join(workdir, "remotes")}/{{}}'
+            os.environ['VIZIR_GITLAB_URL'] = gitlab.url
+            os.environ['VIZIR_CACHE'] = os.path.join(workdir, 'cache')
+            sys.path.insert(0, APP_DIR)
+            from vzr import processor  # pylint: disable=C0415
+
+            timer = Timer()
+            for name, stage in STAGES.items():
+                setattr(processor, name, timer.wrap(stage, getattr(processor, name)))
+            options = {'staging': args.staging, 'publish': args.publish,
+                       'incremental': args.incremental, 'io_jobs': args.io_jobs}
+
+            runs = []
+            for i in range(args.warmup + args.runs):
+                timings = run(directory, options, timer)
+                timings['yava_validate'] = time_validation(directory, args.validations)
+                if i >= args.warmup:
+                    runs.append(timings)
+                print(f'Run {i + 1}: {timings["total"]:.3f}s'
+                      f'{" (warm-up)" if i < args.warmup else ""}', file=sys.stderr)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    parameters = {key: getattr(args, key) for key in ('projects', 'sections', 'repos', 'files',
+                                                      'pages', 'locales', 'validations',
+                                                      'staging', 'publish', 'incremental',
+                                                      'io_jobs')}
+    results = {'parameters': parameters,
+               'environment': {'python': platform.python_version(),
+                               'platform': platform.platform(),
+                               'sphinx': sys.modules['sphinx'].__version__},
+               'stages': summarize(runs)}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf8') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf8') as file:
+            regressed = compare(results, json.load(file), args.tolerance)
+        if regressed:
+            sys.exit(f'Regressed stages: {", ".join(regressed)}')
+
+
+if __name__ == '__main__':
+    main()
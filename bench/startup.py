@@ -0,0 +1,121 @@
+#!/usr/bin/python3
+
+
+"""
+This script measures the startup of the Vizir CLI with python -X importtime, and fails if the
+commands which only read files load the heavy dependencies again or exceed their import budget
+"""
+
+
+import os
+import sys
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+
+VIZIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'app', 'vizir')
+
+# The top-level modules which must not be imported by the light commands
+FORBIDDEN = ('sphinx', 'docutils', 'jinja2', 'git', 'gitlab', 'requests', 'multiprocessing')
+
+# The cumulative import time allowed for each command, in milliseconds
+BUDGET = 150
+
+DOCS_YML = """\
+project:
+  repo: docs/project
+  version: 1
+  copyright: ResEl
+  release: 1
+  docs:
+    files:
+      plus: '*.md'
+      to: .
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Parse the output of python -X importtime
+    :param stderr: The standard error of the process
+    :return: A list of (module, self time, cumulative time, depth) tuples, the times being in
+             microseconds and the depth of the top-level imports being 0
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        # The top-level imports are indented by one space, and each level by two more
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((name.strip(), int(self_time), int(cumulative), depth))
+    return imports
+
+
+def measure(args, directory):
+    """
+    Run a Vizir command with python -X importtime
+    :param args: The command arguments
+    :param directory: The working directory
+    :return: The parsed imports
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', VIZIR] + args, cwd=directory,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                            check=False)
+    if result.returncode:
+        print(result.stderr, file=sys.stderr)
+        raise SystemExit(f'vizir {" ".join(args)} exited with status {result.returncode}')
+    return parse_importtime(result.stderr)
+
+
+def check(name, imports, budget, top=5):
+    """
+    Report the imports of a command and check them against the budget
+    :param name: The command name
+    :param imports: The parsed imports
+    :param budget: The cumulative import time allowed, in milliseconds
+    :param top: The number of slowest top-level imports to show
+    :return: The list of the problems found
+    """
+    roots = [i for i in imports if i[3] == 0]
+    total = sum(i[2] for i in roots) / 1000
+    print(f'{name}: {total:.1f} ms in {len(imports)} imports (budget {budget} ms)')
+    for module, _, cumulative, _ in sorted(roots, key=lambda i: -i[2])[:top]:
+        print(f'    {cumulative / 1000:8.1f} ms  {module}')
+
+    problems = []
+    loaded = {i[0].split('.')[0] for i in imports}
+    for module in FORBIDDEN:
+        if module in loaded:
+            problems.append(f'{name} imports {module}')
+    if total > budget:
+        problems.append(f'{name} takes {total:.1f} ms to import, over the {budget} ms budget')
+    return problems
+
+
+def main():
+    """Run the benchmark"""
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument('--budget', type=float, default=BUDGET,
+                        help=f'import time allowed per command, in ms (default {BUDGET})')
+    parser.add_argument('-n', '--runs', type=int, default=5,
+                        help='runs per command, the fastest one being kept (default 5)')
+    args = parser.parse_args()
+
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, '.docs.yml'), 'w', encoding='utf8') as file:
+            file.write(DOCS_YML)
+        for name, command in (('help', ['--help']), ('validate', ['validate'])):
+            runs = [measure(command, directory) for _ in range(args.runs)]
+            fastest = min(runs, key=lambda imports: sum(i[2] for i in imports if i[3] == 0))
+            problems += check(name, fastest, args.budget)
+
+    for problem in problems:
+        print(f'FAIL {problem}', file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()